@@ -74,8 +74,10 @@ def main():
     physio_files = glob(op.join(phys_dir, '*.acq'))
 
     def _get_physio_acq_time(physio_file):
-        # Return the method to get the acq_time for a .acq file:
-        return bioread.read_file(physio_file).earliest_marker_created_at
+        # Return the method to get the acq_time for a .acq file.
+        # read_headers parses only the headers and markers, so the
+        # channel data (the bulk of the file) is never decoded:
+        return bioread.read_headers(physio_file).earliest_marker_created_at
 
     session2bids.convert_session(
         physio_files,
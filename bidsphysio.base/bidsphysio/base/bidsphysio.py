@@ -41,6 +41,7 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import gzip
 import json
 
 import numpy as np
@@ -334,12 +335,16 @@ class PhysioData(object):
         else: # Eyetracking data case
             myFmt=['% d' if item.label in {'trigger','fixation', 'saccade', 'blink', 'samples'} else '%.1f' for item in self.signals]
         
-        np.savetxt(
-            data_fName,
-            np.transpose( [item.signal for item in self.signals] ),
-            fmt=myFmt,
-            delimiter='\t'
-        )
+        # Stream through gzip ourselves: compresslevel=1 favors speed (the
+        # default level used when np.savetxt opens the .gz itself is several
+        # times slower for a marginal size gain):
+        with gzip.open(data_fName, 'wb', compresslevel=1) as f:
+            np.savetxt(
+                f,
+                np.transpose( [item.signal for item in self.signals] ),
+                fmt=myFmt,
+                delimiter='\t'
+            )
 
     def save_to_bids(self, bids_fName=None):
         """
@@ -489,7 +494,26 @@ class PhysioData(object):
         #       checking the mean/mode timing between triggers, and decide
         #       a run is finished when there is a gap of more than 3x
         #       the mean/mode. That way you can get all the onsets
-        return self.get_trigger_timing()[0]
+
+        trig_physiosignal = self.get_trigger_physiosignal()
+
+        # make sure we have the timing of the trigger samples; otherwise, calculate:
+        if len(trig_physiosignal.sampling_times) == 0:
+            try:
+                trig_physiosignal.calculate_timing()
+            except Exception as e:
+                print(e)
+                return None
+
+        # find the first sample with the trigger on (>0) directly, rather
+        # than materializing the times of every in-pulse sample (as
+        # 'get_trigger_timing' does) just to keep the first one:
+        trig_on = np.asarray(trig_physiosignal.signal) > 0
+        first_trig_idx = int(trig_on.argmax())
+        if not trig_on[first_trig_idx]:
+            # no trigger was received at all; fail like 'timing[0]' would:
+            raise IndexError('list index out of range')
+        return trig_physiosignal.sampling_times[first_trig_idx]
 
     def save_to_bids_with_trigger(self, bids_fName=None):
         """
@@ -45,6 +45,7 @@ SOFTWARE.
 """
 
 import argparse
+from functools import lru_cache
 import json
 import os
 import sys
@@ -55,19 +56,102 @@ pd.options.mode.chained_assignment = None
 from pyedfread import edf
 from pyedfread import edfread
 
+# numba is optional: if it is available we JIT-compile the event-interval
+# fill, otherwise the plain Python version is used
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
 from bidsphysio.base.bidsphysio import (PhysioSignal,
                                         PhysioData)
 from bidsphysio.events.eventsbase import (EventSignal,
                                         EventData)
 
+@lru_cache(maxsize=8)
+def _cached_read_messages(physio_edf, mtime):
+    # mtime is part of the key so that a file modified on disk is re-read
+    return edfread.read_messages(physio_edf)
+
+@lru_cache(maxsize=8)
+def _cached_pread(physio_edf, mtime, trial_marker):
+    return edf.pread(physio_edf, trial_marker=trial_marker)
+
+@lru_cache(maxsize=8)
+def _cached_read_preamble(physio_edf, mtime):
+    return edfread.read_preamble(physio_edf)
+
+def read_edf_data(physio_edf, trial_marker=b'TRIALID'):
+    """Reads the samples/events/messages dataframes of an EDF file, caching
+    the result so that converting both the physio signals and the task
+    events of the same file (as edfsession2bids does) parses it only once.
+    Callers should not mutate the returned dataframes in place."""
+    physio_edf = os.path.abspath(physio_edf)
+    return _cached_pread(physio_edf, os.path.getmtime(physio_edf), trial_marker)
+
+def read_edf_preamble(physio_edf):
+    """Reads (and caches) the preamble of an EDF file"""
+    physio_edf = os.path.abspath(physio_edf)
+    return _cached_read_preamble(physio_edf, os.path.getmtime(physio_edf))
+
+def read_edf_messages(physio_edf):
+    """Reads the messages of an EDF file, caching the result so that the
+    same file is not parsed again by the different conversion functions"""
+    physio_edf = os.path.abspath(physio_edf)
+    return _cached_read_messages(physio_edf, os.path.getmtime(physio_edf))
+
+def iter_messages(physio_edf):
+    """Yields the messages of an EDF file one at a time, so callers can
+    process them in a single forward pass"""
+    yield from read_edf_messages(physio_edf)
+
+def _fill_eye_events(start_idx, end_idx, type_code, blink_flag, gx,
+                     fixation, saccade, blink):
+    #Marks the fixation/saccade/blink samples for each event interval.
+    #type_code: 0=fixation, 1=saccade (anything else is ignored).
+    #Kept numba-njit compatible: plain loops and slice writes only.
+    for i in prange(len(start_idx)):
+        s = start_idx[i]
+        e = end_idx[i]
+        if type_code[i] == 0:
+            fixation[s:e] = 1
+        elif type_code[i] == 1:
+            saccade[s:e] = 1
+            if blink_flag[i]:
+                #during a blink the gaze takes the missing value 1e8;
+                #find the first and last such sample within the saccade
+                bs = -1
+                be = -1
+                for j in range(s, e):
+                    if gx[j] == 100000000.0:
+                        if bs < 0:
+                            bs = j
+                        be = j
+                if bs >= 0:
+                    blink[bs:be] = 1
+
+if njit is not None:
+    _fill_eye_events = njit(parallel=True, cache=True)(_fill_eye_events)
+
+#Recorded-eye label and columns to save for each value of the "which eye"
+#field of the RECCFG message (null-stripped bytes, so no decoding needed):
+_EYE_SPEC = {
+    b'R': ('Right', ("samples", "gx_right", "gy_right", "pa_right", "trigger")),
+    b'L': ('Left', ("samples", "gx_left", "gy_left", "pa_left", "trigger")),
+    b'LR': ('Both', ("samples", "gx_left", "gy_left", "gx_right", "gy_right", "pa_left", "pa_right", "trigger")),
+}
+
 #Function to find the a particular line in a raw edf file's messages
 def find_line_with_string(input_text, input_string):
-    #returns only the last line containing the input string
-    for line in range(len(input_text)):
-        if input_string in input_text[line]:
-            found_line = line
-
-    return found_line
+    #returns only the last line containing the input string. Joining the
+    #messages once and scanning backwards with rfind keeps the byte search
+    #at C level instead of a Python-level 'in' per line
+    buf = b'\n'.join(input_text)
+    off = buf.rfind(input_string)
+    if off == -1:
+        return None
+    return buf.count(b'\n', 0, off)
 
 def edf2bids( physio_edf, skip_eye_events=False ):
     """Reads the EDF file and saves the continuous eye movement data in a PhysioData member
@@ -85,59 +169,71 @@ def edf2bids( physio_edf, skip_eye_events=False ):
         PhysioData with the contents of the file
     """
     #Read EDF data into three pandas dataframes
-    samples, events, messages = edf.pread(physio_edf)
+    samples, events, messages = read_edf_data(physio_edf)
     
     #First we will work on our physio signal
-    #Remove rows that only have zero values
-    samples=samples.loc[~(samples==0).all(axis=1)]
-    
-    #Create a new column to hold the original samples
-    samples['samples'] = samples['time']
-    
-    #Turn time to seconds and adjust time so that it starts at 0
-    samples.time = (samples.time - samples.time[0])/1000
-    sample_times = samples.time.values.tolist()
+    #Remove rows that only have zero values ('any' on the raw array keeps
+    #rows with at least one nonzero cell, without materializing a full
+    #boolean DataFrame of element-wise comparisons)
+    samples=samples.loc[samples.to_numpy().any(axis=1)]
     
+    #Keep the original samples (plain int64 sample IDs) as a function-scope
+    #array rather than duplicating the time column inside the DataFrame
+    samp_arr = samples['time'].to_numpy(dtype=np.int64)
+
+    #Turn time to seconds and adjust time so that it starts at 0. Keep
+    #float64: at float32 precision the spacing error beyond ~16 s exceeds
+    #the tolerance of PhysioSignal.plug_missing_data, which would then
+    #inject spurious "missing" samples into contiguous recordings
+    t0 = samples['time'].iat[0]
+    samples['time'] = (samples['time'].to_numpy() - t0) / 1000
+    #Keep the times as a NumPy array: PhysioSignal works with arrays and
+    #converting to a Python list would box every sample as a Python float
+    sample_times = samples['time'].to_numpy()
+
     #Find sampling frequency and which eye was recorded from messages
-    message = edfread.read_messages(physio_edf)
+    message = read_edf_messages(physio_edf)
     RECCFG_line = find_line_with_string(message, b'RECCFG')
-    sampling_frequency = message[RECCFG_line].split()[2].decode('utf-8')
-    which_eye = message[RECCFG_line].split()[5].decode('utf-8')
-    
+    RECCFG_parts = message[RECCFG_line].split()
+    sampling_frequency = RECCFG_parts[2].decode('utf-8')
+    which_eye = RECCFG_parts[5].rstrip(b'\x00')
+
     #Define columns to save: We are saving gaze, pupil area size, trigger, and optionally fixations, saccades and blinks but we can modify it to include head reference coordinates, velocities etc.
     samples = samples.rename(columns={'input': 'trigger'})
     #TODO: Rename other columns?
-    if which_eye=='R\x00':
-        column_list = ["samples", "gx_right", "gy_right", "pa_right", "trigger"]
-        recorded_eye = 'Right'
-    elif which_eye=='L\x00':
-        column_list = [ "samples", "gx_left", "gy_left", "pa_left", "trigger"]
-        recorded_eye = 'Left'
-    elif which_eye=='LR\x00':
-        column_list = [ "samples", "gx_left", "gy_left", "gx_right", "gy_right", "pa_left", "pa_right", "trigger"]
-        recorded_eye = 'Both'
+    recorded_eye, column_list = _EYE_SPEC[which_eye]
+    column_list = list(column_list)
 
     #If wanted, save fixations, saccades and blinks in additional columns
     if skip_eye_events==False:
-        samples['fixation']=0
-        samples['saccade']=0
-        samples['blink']=0
-    
-        for ind, value in enumerate(events.type):
-            ind_s = samples[samples['samples']== events.start[ind]].index.values
-            ind_e = samples[samples['samples']== events.end[ind]].index.values
-            if value == 'fixation':
-                samples.fixation[int(ind_s):int(ind_e)]=1
-            if value == 'saccade':
-                samples.saccade[int(ind_s):int(ind_e)]=1
-                if events.blink[ind] == True:
-                    if which_eye=='R\x00':
-                        gaze_with_sacc = samples.gx_right[int(ind_s):int(ind_e)]
-                    else:
-                        gaze_with_sacc = samples.gx_left[int(ind_s):int(ind_e)]
-                    ind_bs = gaze_with_sacc[gaze_with_sacc==100000000.0].first_valid_index()
-                    ind_be = gaze_with_sacc[gaze_with_sacc==100000000.0].last_valid_index()
-                    samples.blink[int(ind_bs):int(ind_be)]=1
+        #Fill plain NumPy arrays (direct slice writes, no chained DataFrame
+        #assignment) and attach them as columns at the end
+        fixation = np.zeros(len(samples), dtype=np.uint8)
+        saccade = np.zeros(len(samples), dtype=np.uint8)
+        blink = np.zeros(len(samples), dtype=np.uint8)
+
+        #Find the sample indices delimiting each event. The sample times are
+        #monotonically increasing, so a binary search over all the events at
+        #once replaces a full-column equality scan per event:
+        start_idx = np.searchsorted(samp_arr, events.start.to_numpy())
+        end_idx = np.searchsorted(samp_arr, events.end.to_numpy())
+
+        #Encode the event types/flags as plain arrays and run the interval
+        #fill in one (numba-compilable) kernel:
+        type_code = np.full(len(events), -1, dtype=np.int8)
+        type_code[events.type.to_numpy()=='fixation'] = 0
+        type_code[events.type.to_numpy()=='saccade'] = 1
+        blink_flag = events.blink.to_numpy().astype(np.bool_)
+        if which_eye==b'R':
+            gx = samples.gx_right.to_numpy(dtype=np.float64)
+        else:
+            gx = samples.gx_left.to_numpy(dtype=np.float64)
+        _fill_eye_events(start_idx, end_idx, type_code, blink_flag, gx,
+                         fixation, saccade, blink)
+
+        samples['fixation'] = fixation
+        samples['saccade'] = saccade
+        samples['blink'] = blink
 
         optional_columns = ["fixation", "saccade", "blink"]
         column_list.extend(optional_columns)
@@ -146,24 +242,23 @@ def edf2bids( physio_edf, skip_eye_events=False ):
     physio = PhysioData()
 
     #Go through the columns and keep the signals we are interested in. Value -32768.0 indicates missing values
-    for wc in range(len(column_list)):
-        indc = np.where(column_list[wc]==samples.columns)[0]
-        physio_label = samples.columns[indc][0]
-        s = samples[samples.columns[indc][0]].values.tolist()
-        
-        if not ((samples[samples.columns[indc][0]]==0.0).all()
-                or (samples[samples.columns[indc][0]]==127.0).all()
-                or (samples[samples.columns[indc][0]]==32768.0).all()
-                or (samples[samples.columns[indc][0]]==-32768.0).all()):
-           
-            physio.append_signal(
-                PhysioSignal(
-                    label=physio_label,
-                    samples_per_second = int(sampling_frequency),
-                    sampling_times = sample_times,
-                    signal = s
-                )
+    #A column is skipped when it is constant at one of the sentinel values
+    #(0, 127, +/-32768), which a single equality pass against the first
+    #element detects, instead of four separate full-column comparisons:
+    for physio_label in column_list:
+        s = samp_arr if physio_label == 'samples' else samples[physio_label].to_numpy()
+
+        if len(s) and s[0] in (0.0, 127.0, 32768.0, -32768.0) and (s == s[0]).all():
+            continue
+
+        physio.append_signal(
+            PhysioSignal(
+                label=physio_label,
+                samples_per_second = int(sampling_frequency),
+                sampling_times = sample_times,
+                signal = s
             )
+        )
 
     # Add "RecordedEye" as an attribute to the physio object so as to save it in the .json file
     setattr(physio, 'RecordedEye', recorded_eye)
@@ -199,20 +294,33 @@ def edfevents2bids(physio_edf):
         EventData with the contents of the file
     """
     
-    #Read messages sent to the eyetracker
-    message = edfread.read_messages(physio_edf)
-    MR_line= find_line_with_string(message, b'!MODE RECORD') #sent messages appear after line of "MODE RECORD"
-    sent_messages = np.unique(edfread.read_messages(physio_edf)[MR_line+1:])
-    EventIdentifiers=[]
-    for sm in sent_messages:
-        EventIdentifiers.append(sm)
+    #Read messages sent to the eyetracker. The sent messages appear after
+    #the (last) "MODE RECORD" line, so we collect the unique ones in a single
+    #forward pass, resetting whenever we hit a new "MODE RECORD" line:
+    sent_messages = set()
+    for sm in iter_messages(physio_edf):
+        if b'!MODE RECORD' in sm:
+            sent_messages.clear()
+        else:
+            sent_messages.add(sm)
+    #No need to sort: the identifiers are only used for membership testing
+    EventIdentifiers = list(sent_messages)
     
     # Read the EDF data into three pandas dataframes including the messages
     # TODO: delete the unecessary columns?
-    all_messages = pd.DataFrame()
-    for tm in EventIdentifiers:
-        samples, events, messages = edf.pread(physio_edf, trial_marker = tm)
-        all_messages = all_messages.append(messages, ignore_index = True)
+    # With an empty trial_marker every sent message starts a "trial", so a
+    # single read gives us all of them and we can keep just the ones matching
+    # an EventIdentifier with a vectorized mask, instead of re-parsing the
+    # whole EDF file once per identifier.
+    samples, events, all_messages = read_edf_data(physio_edf, trial_marker=b'')
+    if not all_messages.empty:
+        identifiers = set(EventIdentifiers)
+        identifiers.update(
+            tm.decode('utf-8') for tm in EventIdentifiers if isinstance(tm, bytes)
+        )
+        all_messages = all_messages[
+            all_messages['trialid '].isin(identifiers)
+        ].reset_index(drop=True)
 
     if all_messages.empty:
         event = []
@@ -231,12 +339,12 @@ def edfevents2bids(physio_edf):
         all_messages['duration']=0
         
         #If a trigger channel is available in the edf recording, adjust onset to be measured with respect to the first trigger
-        samples=samples.loc[~(samples==0).all(axis=1)]
+        samples=samples.loc[samples.to_numpy().any(axis=1)]
         samples.time = (samples.time - samples.time[0])/1000
-        if not ((samples['input']==0.0).all()
-                or (samples['input']==127.0).all()
-                or (samples['input']==32768.0).all()
-                or (samples['input']==-32768.0).all()):
+        #(same single-pass constant-at-sentinel check as in edf2bids)
+        trig = samples['input'].to_numpy()
+        if not (len(trig) and trig[0] in (0.0, 127.0, 32768.0, -32768.0)
+                and (trig == trig[0]).all()):
             tmp = np.array(samples.input)
             counts, bin_edges = np.histogram( tmp[~np.isnan(tmp)],bins=10, range=[min(tmp), max(tmp)])
             first_bin = bin_edges[np.argmax(counts)] + (bin_edges[1]-bin_edges[0])/2
@@ -28,11 +28,20 @@ from glob import glob
 import os.path as op
 from datetime import datetime
 
-from pyedfread import edfread
-
 from bidsphysio.edf2bids import edf2bidsphysio
 from bidsphysio.session import session2bids
 
+
+def _get_physio_acq_time(physio_file):
+    # module-level (rather than nested in main) so that it can be pickled
+    # when the session is converted with a process pool
+    buf= edf2bidsphysio.read_edf_preamble(physio_file)
+    buff_lines = buf.splitlines()
+    buff_parts = buff_lines[0].split()
+    time_obj = datetime.strptime(buff_parts[5].decode("utf-8"), '%H:%M:%S')
+    return time_obj
+
+
 def main():
     # Parse command line arguments
     parser = argparse.ArgumentParser(
@@ -66,13 +75,6 @@ def main():
 
     physio_files = glob(op.join(phys_dir, '*.edf'))
 
-    def _get_physio_acq_time(physio_file):
-        buf= edfread.read_preamble(physio_file)
-        buff_lines = buf.splitlines()
-        buff_parts = buff_lines[0].split()
-        time_obj = datetime.strptime(buff_parts[5].decode("utf-8"), '%H:%M:%S')
-        return time_obj
-
     session2bids.convert_edf_session(
         physio_files,
         bids_dir,
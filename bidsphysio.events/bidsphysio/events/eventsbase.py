@@ -1,10 +1,144 @@
 # TODO: make sure onset and duration are there and that they are float numbers in seconds
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import json
 
 import numpy as np
 import pandas as pd
 
+# orjson serializes much faster than the stdlib json and handles NumPy
+# scalars natively; fall back to json when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# numba (optional) JIT-compiles the numeric TSV formatter below; without
+# it we keep the vectorized np.char.mod path
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+@lru_cache(maxsize=4096)
+def _strip_suffixes(name, suffixes):
+    """
+    Removes each of the (ordered) suffixes from the end of 'name', if
+    present. Cached, since batch pipelines normalize the same prefixes
+    over and over.
+    """
+    for mystr in suffixes:
+        name = name.removesuffix(mystr)
+    return name
+
+
+#dtype corresponding to each EventSignal "type". Strings are coerced to a
+#fixed-width '<U' array (not object dtype), so the writers can process the
+#column with the vectorized np.char routines:
+_EVENT_DTYPES = {
+    'int': np.int64,
+    'float': np.float64,
+    'str': np.str_,
+}
+
+#printf-style format corresponding to each EventSignal "type":
+_EVENT_FMT = {
+    'int': '%1d',
+    'float': '%.4f',
+}
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _format_float_table(table, out):
+        """
+        Formats a 2D float array as '%.4f' tab-separated rows, straight
+        into the preallocated uint8 buffer 'out'. Returns the number of
+        bytes written
+        """
+        pos = 0
+        nrows, ncols = table.shape
+        for i in range(nrows):
+            for j in range(ncols):
+                if j:
+                    out[pos] = 9          # '\t'
+                    pos += 1
+                x = table[i, j]
+                # copysign also catches -0.0, which '%.4f' renders
+                # with a minus sign:
+                if np.copysign(1.0, x) < 0.0:
+                    out[pos] = 45         # '-'
+                    pos += 1
+                    x = -x
+                # format the value as a scaled integer (4 decimal places):
+                scaled = int(round(x * 10000.0))
+                ipart = scaled // 10000
+                frac = scaled % 10000
+                if ipart == 0:
+                    out[pos] = 48         # '0'
+                    pos += 1
+                else:
+                    start = pos
+                    while ipart:
+                        out[pos] = 48 + ipart % 10
+                        ipart //= 10
+                        pos += 1
+                    # the digits came out backwards; reverse them in place:
+                    end = pos - 1
+                    while start < end:
+                        out[start], out[end] = out[end], out[start]
+                        start += 1
+                        end -= 1
+                out[pos] = 46             # '.'
+                pos += 1
+                out[pos] = 48 + frac // 1000
+                out[pos + 1] = 48 + (frac // 100) % 10
+                out[pos + 2] = 48 + (frac // 10) % 10
+                out[pos + 3] = 48 + frac % 10
+                pos += 4
+            out[pos] = 10                 # '\n'
+            pos += 1
+        return pos
+else:
+    _format_float_table = None
+
+
+def _format_event_rows(events):
+    """
+    Formats a list of EventSignals as the (bytes) tab-separated data rows
+    of the "_events.tsv" file
+    """
+    if all(item.type == 'float' for item in events):
+        # numeric-only fast path:
+        table = np.column_stack([item.event for item in events])
+        if (
+                _format_float_table is not None
+                and table.size
+                and np.isfinite(table).all()
+                # the kernel scales by 10000 into an int64, which would
+                # overflow just above 9.22e14:
+                and np.abs(table).max() < 9e14
+        ):
+            # JIT-compiled formatter: sign + 16 integer digits + '.' +
+            # 4 decimals + separator = 23 bytes per value, worst case
+            out = np.empty(table.size * 23, dtype=np.uint8)
+            nbytes = _format_float_table(table, out)
+            return out[:nbytes].tobytes()
+        # without numba, format the whole stacked table with a single
+        # np.char.mod call instead of column by column
+        table = np.char.mod('%.4f', table)
+        return '\n'.join(
+            '\t'.join(row) for row in table.tolist()
+        ).encode('utf-8') + b'\n'
+
+    columns = [item.formatted() for item in events]
+    rows = columns[0]
+    for column in columns[1:]:
+        rows = np.char.add(np.char.add(rows, '\t'), column)
+    return '\n'.join(rows.tolist()).encode('utf-8') + b'\n'
+
 
 class EventSignal(object):
     """
@@ -15,10 +149,15 @@ class EventSignal(object):
         Event label (e.g., 'onset', 'duration', 'trial_type')
     units : str
     description : str
-    event : list of numbers or strings
+    event : np.ndarray of numbers or strings
         The events information. Columns onset and duration are floats in seconds and are mandatory.
+        (Coerced to a typed array at construction, so the writers work on
+        homogeneous columns instead of re-dispatching on 'type'.)
     type : str
         Describes the type of event ( str, int or float)
+    event_mmap_path : str or None
+        If given, the (numeric) events are backed by a np.memmap at this
+        path instead of living in RAM. Useful for very large event tables.
     """
 
     def __init__(
@@ -27,14 +166,38 @@ class EventSignal(object):
             units="",
             description="",
             event=[],
-            type=""
+            type="",
+            event_mmap_path=None
             ):
         self.label = label
         self.units = units
         self.description = description
-        self.event = event
+        if event_mmap_path is not None:
+            arr = np.asarray(event, dtype=_EVENT_DTYPES.get(type, np.float64))
+            mmap = np.memmap(event_mmap_path, mode='w+',
+                             dtype=arr.dtype, shape=arr.shape)
+            mmap[:] = arr
+            mmap.flush()
+            self.event = mmap
+        else:
+            self.event = np.asarray(event, dtype=_EVENT_DTYPES.get(type))
         self.type = type
-       
+        self._formatted = None
+
+    def formatted(self):
+        """
+        Returns (and caches) the events formatted as an array of strings,
+        according to the signal type
+        """
+        if self._formatted is None or len(self._formatted) != len(self.event):
+            fmt = _EVENT_FMT.get(self.type)
+            if fmt is not None:
+                self._formatted = np.char.mod(fmt, self.event)
+            else:
+                # 'str' (or anything else) is saved verbatim:
+                self._formatted = self.event.astype(str)
+        return self._formatted
+
 
 class EventData(object):
     """
@@ -48,12 +211,23 @@ class EventData(object):
             ):
         self.events = events if events is not None else []
         self.bidsprefix = bidsprefix
+        self._labels_cache = None
 
     def labels(self):
         """
         Returns a list with the labels of all the events columns
+        (cached until a new event is appended)
+        """
+        if self._labels_cache is None:
+            self._labels_cache = [ item.label for item in self.events ]
+        return self._labels_cache
+
+    def labels_iter(self):
+        """
+        Yields the labels of the events columns one at a time, without
+        materializing a list
         """
-        return [ item.label for item in self.events ]
+        return (item.label for item in self.events)
 
     def append_event(self, event):
         """
@@ -67,6 +241,7 @@ class EventData(object):
             self.events.append( event )
         else:
             self.events = [event]
+        self._labels_cache = None
 
     def set_bidsprefix(self, bidsprefix):
         """
@@ -74,8 +249,7 @@ class EventData(object):
         """
 
         # remove '_bold.nii(.gz)' or '_events' if present **at the end of the bidsPrefix**
-        for mystr in ['.gz', '.nii', '_bold', '_events']:
-            bidsprefix = bidsprefix[:-len(mystr)] if bidsprefix.endswith(mystr) else bidsprefix
+        bidsprefix = _strip_suffixes(bidsprefix, ('.gz', '.nii', '_bold', '_events'))
 
         # Whatever is left, we assign to the bidsprefix class attribute:
         self.bidsprefix = bidsprefix
@@ -88,74 +262,64 @@ class EventData(object):
 
         # make sure the file name ends with "_events.json" by removing it (if present)
         #   and adding it back:
-        for myStr in ['.json','_events']:
-            json_fName = json_fName[:-len(myStr)] if json_fName.endswith( myStr ) else json_fName
-        json_fName = json_fName + '_events.json'
-
-        with open( json_fName, 'w') as f:
-            json.dump({
-                "Columns": [item.label for item in self.events],
-                **{            # this syntax allows us to add the elements of this dictionary to the one we are creating
-                    item.label: {
-                        "Units": item.units
-                    }
-                    for item in self.events if item.units != ""
-                      #item.label: {
-                      # "Description": item.description
-                      #}
-                      #for item in self.events if item.description != ""
+        json_fName = _strip_suffixes(json_fName, ('.json', '_events')) + '_events.json'
+
+        # serialize in memory and write the whole payload at once
+        # (json.dump interleaves many small writes into the file):
+        header = {
+            "Columns": list(self.labels_iter()),
+            **{            # this syntax allows us to add the elements of this dictionary to the one we are creating
+                item.label: {
+                    "Units": item.units
                 }
-            }, f, sort_keys = True, indent = 4, ensure_ascii = False)
-            f.write('\n')
+                for item in self.events if item.units != ""
+                  #item.label: {
+                  # "Description": item.description
+                  #}
+                  #for item in self.events if item.description != ""
+            }
+        }
+        if orjson is not None:
+            payload = orjson.dumps(
+                header, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+            )
+        else:
+            payload = json.dumps(
+                header, sort_keys = True, indent = 4, ensure_ascii = False
+            ).encode('utf-8')
+        with open( json_fName, 'wb', buffering=1 << 20) as f:
+            f.write(payload + b'\n')
 
     def save_events_bids_data(self, data_fName):
         """
-        Saves the EventData object to the BIDS .tsv.gz file.
+        Saves the EventData object to the BIDS .tsv file.
+        (BIDS events files are not compressed, unlike the physio ones.)
         It's the responsibility of the calling function to make sure they can all be
         saved in the same file.
         """
 
-        # make sure the file name ends with "_events.tsv.gz":
-        for myStr in ['.gz','.tsv','_bold','_events']:
-            if data_fName.endswith( myStr ):
-                data_fName = data_fName[:-len(myStr)]
-        
-        data_fName = data_fName + '_events.tsv'
-
-        # Save the data:
-        myFmt=[]
-        for item in self.events:
-            if item.type == 'str':
-                myfmt = '%s'
-            elif item.type == 'int':
-                myfmt = '%1d'
-            elif item.type == 'float':
-                myfmt = '%.4f'
-            myFmt.append(myfmt)
-
-        header=[item.label for item in self.events]
-        header_str="\t".join(str(x) for x in header)
-        with open(data_fName, 'wb') as f:
+        # make sure the file name ends with "_events.tsv":
+        data_fName = _strip_suffixes(data_fName, ('.gz', '.tsv', '_bold', '_events')) + '_events.tsv'
+
+        # Save the data. Each column is formatted as a whole with np.char.mod
+        # (instead of letting np.savetxt format the table row by row through
+        # an object-dtype transpose), the rows are joined in memory and the
+        # payload is written in one go:
+        header_str="\t".join(str(x) for x in self.labels())
+        rows = _format_event_rows(self.events)
+        # a large explicit buffer keeps the number of write() syscalls low:
+        with open(data_fName, 'wb', buffering=1 << 20) as f:
             f.write(header_str.encode('utf-8')+ b'\n')
-            np.savetxt(
-                       f,
-                       np.transpose( [item.event for item in self.events] ),
-                       fmt=myFmt,
-                       delimiter='\t'
-            )
+            f.write(rows)
         print('Saving task events')
 
     def append_events_bids_data(self, data_fName):
         """
-        Appends the EventData object to the existing BIDS .tsv.gz file. Then opens the file an sorts the events based on their 'onset'.
+        Appends the EventData object to the existing BIDS .tsv file. Then opens the file an sorts the events based on their 'onset'.
         """
         
-        # make sure the file name ends with "_events.tsv.gz":
-        for myStr in ['.gz','.tsv','_bold','_events']:
-            if data_fName.endswith( myStr ):
-                data_fName = data_fName[:-len(myStr)]
-    
-        data_fName = data_fName + '_events.tsv'
+        # make sure the file name ends with "_events.tsv":
+        data_fName = _strip_suffixes(data_fName, ('.gz', '.tsv', '_bold', '_events')) + '_events.tsv'
         
         #If there is an 'eyetracker label' in self, append a new EventSignal to self
         if hasattr(self, 'Eyetracker'):
@@ -167,27 +331,12 @@ class EventData(object):
                 )
         )
         
-        # Save the data:
-        myFmt=[]
-        for item in self.events:
-            if item.type == 'str':
-                myfmt = '%s'
-            elif item.type == 'int':
-                myfmt = '%1d'
-            elif item.type == 'float':
-                myfmt = '%.4f'
-            myFmt.append(myfmt)
-
-        header=[item.label for item in self.events]
-        header_str="\t".join(str(x) for x in header)
-        with open(data_fName, 'ab') as f:
+        # Save the data (same vectorized formatting as "save_events_bids_data"):
+        header_str="\t".join(str(x) for x in self.labels())
+        rows = _format_event_rows(self.events)
+        with open(data_fName, 'ab', buffering=1 << 20) as f:
             f.write(header_str.encode('utf-8')+ b'\n')
-            np.savetxt(
-                       f,
-                       np.transpose( [item.event for item in self.events] ),
-                       fmt=myFmt,
-                       delimiter='\t'
-            )
+            f.write(rows)
         
         #Open file with appended data
         df = pd.read_csv(data_fName, sep='\t')
@@ -198,9 +347,9 @@ class EventData(object):
             df2 = df.iloc[ind[0]:,:]
             df2.columns = df2.iloc[0] # make new header
             df2 = df2[1:]   #drop header
-            df1 = df1.append(df2) #merge two dataframes
+            df1 = pd.concat([df1, df2]) #merge two dataframes
             df1 = df1.dropna(axis=1, how='all') #drop columns that only have NaNs
-            df1 = df1.replace(np.NaN, 'n/a') #drop columns that contain only NaNs
+            df1 = df1.replace(np.nan, 'n/a') #drop columns that contain only NaNs
             df1.onset = df1.onset.astype(float)
             df1.duration = df1.duration.astype(float)
             df1 = df1.sort_values(by=['onset'], ascending=True) #sort based on onset
@@ -212,7 +361,7 @@ class EventData(object):
     def save_events_to_bids(self, bids_fName=None):
         """
         Saves the EventData sidecar '.json' file(s) and signal(s).
-        It saves all events in a single .json/.tsv.gz pair.
+        It saves all events in a single .json/.tsv pair.
         """
         
         if bids_fName:
@@ -226,7 +375,10 @@ class EventData(object):
                 raise Exception('fileName was not a known provided')
         
         print('Saving events files')
-        self.save_events_bids_json(self.bidsprefix)
-        self.save_events_bids_data(self.bidsprefix)
-
-    print('')
+        # the .json and .tsv writes are independent, so overlap them:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            for future in [
+                executor.submit(self.save_events_bids_json, self.bidsprefix),
+                executor.submit(self.save_events_bids_data, self.bidsprefix),
+            ]:
+                future.result()
@@ -11,13 +11,12 @@ CLASSIFIERS = [
     'Environment :: Console',
     'Intended Audience :: Science/Research',
     'License :: OSI Approved :: MIT License',
-    'Programming Language :: Python :: 3.6',
-    'Programming Language :: Python :: 3.7',
-    'Programming Language :: Python :: 3.8',
+    'Programming Language :: Python :: 3.9',
     'Topic :: Scientific/Engineering'
 ]
 
-PYTHON_REQUIRES = ">=3.6"
+# str.removesuffix (used in eventsbase) needs Python 3.9:
+PYTHON_REQUIRES = ">=3.9"
 
 REQUIRES = [
     'numpy >= 1.20.1',
@@ -29,6 +28,8 @@ TESTS_REQUIRES = [
 ]
 
 EXTRA_REQUIRES = {
+    'orjson': ['orjson'],     # faster JSON serialization (optional)
+    'numba': ['numba'],       # JIT-compiled TSV formatting (optional)
     'tests': TESTS_REQUIRES,
 }
 
@@ -5,6 +5,7 @@ from glob import glob
 import gzip
 import json
 import random
+import shutil
 import string
 from os.path import join as pjoin
 
@@ -133,16 +134,21 @@ def test_save_events_bids_data(
         assert [s for s in first_line.strip().split('\t')] == LABELS
 
 def test_append_events_bids_data(
+        tmpdir,
         myeventdata
 ):
     """
     Tests  "append_events_bids_data"
     """
-    data_file_name = str(TESTS_DATA_PATH / 'existing_events.tsv')
-    
+    # work on a copy of the fixture, so appending doesn't modify the
+    # checked-in tests data:
+    data_file_name = pjoin(tmpdir.strpath, 'existing_events.tsv')
+    shutil.copyfile(str(TESTS_DATA_PATH / 'existing_events.tsv'),
+                    data_file_name)
+
     # make sure the filename ends with "_events.tsv"
     myeventdata.append_events_bids_data(data_file_name)
-    data_files = glob(pjoin(TESTS_DATA_PATH, '*.tsv*'))
+    data_files = glob(pjoin(tmpdir, '*.tsv*'))
     assert len(data_files) == 1
     data_file = data_files[0]
     assert data_file.endswith('_events.tsv')
@@ -61,6 +61,28 @@ from bidsphysio.dcm2bids import dcm2bidsphysio as d2bp
 from bidsphysio.pmu2bids import pmu2bidsphysio as p2bp
 
 
+def _run_dcm2bids(infiles, verbose):
+    return d2bp.dcm2bids(infiles, verbose=verbose)
+
+def _run_acq2bids(infiles, verbose):
+    return a2bp.acq2bids(infiles)
+
+def _run_pmu2bids(infiles, verbose):
+    return p2bp.pmu2bids(infiles, verbose=verbose)
+
+# converter to call for each allowed combination of input-file extensions
+# (all files need to be of the same type, except 'puls' and 'resp' PMU
+# files, which can be mixed):
+_DISPATCH = {
+    frozenset({'dcm'}): _run_dcm2bids,
+    frozenset({'log'}): _run_dcm2bids,
+    frozenset({'acq'}): _run_acq2bids,
+    frozenset({'puls'}): _run_pmu2bids,
+    frozenset({'resp'}): _run_pmu2bids,
+    frozenset({'puls', 'resp'}): _run_pmu2bids,
+}
+
+
 def main():
 
     # Parse command line arguments
@@ -70,25 +92,36 @@ def main():
     parser.add_argument('-v', '--verbose', action="store_true", default=False, help='verbose screen output')
     args = parser.parse_args()
 
-    # make sure input files exist:
-    for infile in args.infiles:
-        if not os.path.exists(infile):
-            raise FileNotFoundError('{i} file not found'.format(i=infile))
-
-    # check that the input file is recognized (check extension):
-    knownExtensions = ['dcm', 'puls', 'resp', 'acq', 'log']
-    allowedExtensions = knownExtensions
+    # make sure input files exist. The checks are batched: one scandir per
+    # directory instead of one stat call per file, which matters for large
+    # PMU batches:
+    infiles_by_dir = {}
     for infile in args.infiles:
-        fileExtension = infile.split('.')[-1]
-        if fileExtension not in allowedExtensions:
-            raise Exception("{fe} is not a known physio file extension.".format(fe=fileExtension))
-        else:
-            # For now, all files need to be of the same type. To do that,
-            #   at this point we limit the list of allowedExtensions:
-            if fileExtension in ['puls','resp']:
-                allowedExtensions = ['puls','resp']
-            else:
-                allowedExtensions = fileExtension
+        infiles_by_dir.setdefault(os.path.dirname(infile), []).append(infile)
+    for indir, infiles in infiles_by_dir.items():
+        try:
+            with os.scandir(indir or '.') as entries:
+                present = {e.name for e in entries}
+        except FileNotFoundError:
+            present = set()
+        for infile in infiles:
+            if os.path.basename(infile) not in present:
+                raise FileNotFoundError('{i} file not found'.format(i=infile))
+
+    # check that the input files are recognized and consistent (check
+    # extensions), and pick the converter with a single dict lookup:
+    fileExtensions = frozenset(
+        os.path.splitext(infile)[1][1:] for infile in args.infiles
+    )
+    converter = _DISPATCH.get(fileExtensions)
+    if converter is None:
+        raise Exception(
+            "{fe} is not a known physio file extension.".format(
+                fe='/'.join(sorted(fileExtensions))
+            )
+        )
+    if fileExtensions == {'dcm'} and len(args.infiles) > 1:
+        raise Exception('Only one input file is allowed for DICOM physio files')
 
     # make sure output directory exists:
     odir = os.path.dirname(args.bidsprefix)
@@ -96,18 +129,8 @@ def main():
         if not os.path.exists(odir):
             os.makedirs(odir)
 
-    # depending on the allowedExtension, call the XXX2bids method of corresponding module:
-    physio_data = None
-    if allowedExtensions == 'dcm':
-        if len(args.infiles) > 1:
-            raise Exception('Only one input file is allowed for DICOM physio files')
-        physio_data = d2bp.dcm2bids(args.infiles, verbose=args.verbose)
-    elif allowedExtensions == 'log':
-        physio_data = d2bp.dcm2bids(args.infiles, verbose=args.verbose)
-    elif allowedExtensions == 'acq':
-        physio_data = a2bp.acq2bids(args.infiles)
-    elif allowedExtensions == ['puls', 'resp']:
-        physio_data = p2bp.pmu2bids(args.infiles, verbose=args.verbose)
+    # call the XXX2bids method of the corresponding module:
+    physio_data = converter(args.infiles, args.verbose)
 
     if physio_data.labels():
         physio_data.save_to_bids_with_trigger(args.bidsprefix)
@@ -52,14 +52,113 @@ SOFTWARE.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import math
+import mmap
 import os
 import re
 import sys
 
+import numpy as np
+
 from bidsphysio.base.bidsphysio import (PhysioSignal,
                                         PhysioData)
 
+# numba (optional) JIT-compiles a fused end-marker-search +
+# trigger-masking kernel; without it we keep the NumPy path
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# The patterns are compiled once at import time, so the readers don't pay
+# the compile (or compile-cache lookup) cost once per file:
+_RE_LOGVERSION = re.compile('LOGVERSION_([A-Z]*)')
+# Successful readpmu parses, memoized by file identity (absolute path,
+# mtime, size) and requested software version, so batches that hand us the
+# same file more than once skip the full parse. Capped to bound memory:
+_READ_CACHE = {}
+_READ_CACHE_MAXSIZE = 64
+
+# BIDS label for each known recording type reported by the readers
+# (unknown types are used as the label verbatim):
+_LABEL_MAP = {
+    'PULS': 'cardiac',
+    'PULSE': 'cardiac',      # (VBX reports 'PULSE')
+    'RESP': 'respiratory',
+    'TRIGGER': 'trigger',
+    'EXT_TRIGGER': 'trigger',
+}
+
+# alternation of all the VBX metadata fields, so the metadata region is
+# scanned only once for all of them:
+_RE_VBX_META = re.compile(
+    'Logging ([A-Z]*) signal|_SAMPLES_PER_SECOND = ([0-9]*)'
+)
+
+
+def _split_5002_6002(line):
+    """
+    Splits 'line' (str or bytes) at the "5002 ... 6002" information regions,
+    returning the same list re.split('5002(.*?)6002', line) would (text
+    between regions interleaved with the region contents). The delimiters
+    are literal strings, so plain find beats running the regex engine over
+    the (multi-MB) data line.
+    """
+    d1, d2 = (b'5002', b'6002') if isinstance(line, bytes) else ('5002', '6002')
+    s = []
+    pos = 0
+    while True:
+        a = line.find(d1, pos)
+        if a < 0:
+            break
+        b = line.find(d2, a + 4)
+        if b < 0:
+            break
+        s.append(line[pos:a])
+        s.append(line[a + 4:b])
+        pos = b + 4
+    s.append(line[pos:])
+    return s
+
+
+def _read_pmu_lines(physio_file):
+    """
+    Reads a PMU file as the (possibly multi-MB) first data line --as bytes,
+    so we never pay a decode pass over the signal payload-- plus the decoded
+    trailing statistics lines. The file is mmap-ed, so the OS pages it in
+    lazily.
+    """
+    with open(physio_file, 'rb') as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            raise PMUFormatError(
+                'File %r does not seem to be a valid Siemens PMU file',
+                physio_file
+            )
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            nl = mm.find(b'\n')
+            if nl < 0:
+                nl = len(mm)
+            first_line = mm[:nl].rstrip()
+            tail = [line.decode(errors='replace').rstrip()
+                    for line in mm[nl + 1:].splitlines()]
+    return first_line, tail
+
+
+def _detect_version(first_line):
+    """
+    Guesses the scanner software version from the start of the data line
+    (the version-specific metadata keywords show up within the first few
+    KB), so readpmu can try the most likely reader first. A wrong guess is
+    harmless: the other versions are still tried afterwards.
+    """
+    head = first_line[:4096]
+    if b'LOGVERSION_' in head:
+        return 'VE11C'
+    if b'Logging ' in head:
+        return 'VBX'
+    return 'VB15A'
+
 
 def errmsg(msg, pmuFile, expStr=None, gotStr=None):
     msg = msg.replace('%r', repr(pmuFile))
@@ -114,10 +213,22 @@ def pmu2bids(physio_files, verbose=False):
     # Init PhysioData object to hold physio signals:
     physio = PhysioData()
 
-    # Read the files from the list, extract the relevant information and
-    #   add a new PhysioSignal to the list:
-    for f in physio_files:
-        physio_type, MDHTime, sampling_rate, physio_signal = readpmu(f, verbose=verbose)
+    # Read the files from the list. Each read is independent, so for more
+    #   than one file we parse them in parallel (the I/O and the parsing
+    #   happen in C code, which releases the GIL), keeping input order:
+    if len(physio_files) > 1:
+        with ThreadPoolExecutor(
+                max_workers=min(len(physio_files), os.cpu_count())
+        ) as executor:
+            results = list(
+                executor.map(lambda f: readpmu(f, verbose=verbose), physio_files)
+            )
+    else:
+        results = [readpmu(f, verbose=verbose) for f in physio_files]
+
+    # Extract the relevant information and add a new PhysioSignal to the
+    #   list (serially: PhysioData isn't thread-safe):
+    for physio_type, MDHTime, sampling_rate, physio_signal in results:
 
         testSamplingRate(
                             sampling_rate = sampling_rate,
@@ -125,18 +236,9 @@ def pmu2bids(physio_files, verbose=False):
                             logTimes=MDHTime
         )
 
-        # specify label:
-        if 'PULS' in physio_type:
-            physio_label = 'cardiac'
-
-        elif 'RESP' in physio_type:
-            physio_label = 'respiratory'
-
-        elif "TRIGGER" in physio_type:
-            physio_label = 'trigger'
-
-        else:
-            physio_label = physio_type
+        # specify label (one dict lookup instead of a cascade of
+        #   substring checks):
+        physio_label = _LABEL_MAP.get(physio_type, physio_type)
 
         physio.append_signal(
             PhysioSignal(
@@ -176,7 +278,7 @@ def readpmu(physio_file, softwareVersion=None, verbose=False):
         MDHTime[1] gives the end   of the recording
     sampling_rate : int
         number of samples per second
-    physio_signal : list of int
+    physio_signal : np.ndarray of np.float32
         signal proper. NaN indicate points for which there was no recording
         (the scanner found a trigger in the signal)
     """
@@ -194,17 +296,56 @@ def readpmu(physio_file, softwareVersion=None, verbose=False):
     # Define what versions we need to test:
     versionsToTest = [softwareVersion] if softwareVersion else knownVersions
 
+    # Check whether we have already parsed this very file (same path, mtime
+    #   and size) for this software version:
+    try:
+        st = os.stat(physio_file)
+        cacheKey = (os.path.abspath(physio_file),
+                    st.st_mtime_ns, st.st_size, softwareVersion)
+    except OSError:
+        cacheKey = None
+    if cacheKey in _READ_CACHE:
+        return _READ_CACHE[cacheKey]
+
+    # Read the file once, so the version attempts below don't each re-read
+    #   (and re-frame) the same content:
+    try:
+        preloaded = _read_pmu_lines(physio_file)
+    except PMUFormatError as e:
+        if verbose:
+            print('Warning: ' + str(e))
+        preloaded = None
+        versionsToTest = []
+
+    # If no version was requested, try the most likely one (sniffed from
+    #   the start of the data line) first, so a successful read usually
+    #   skips the failed-attempt parses:
+    if softwareVersion is None and preloaded is not None:
+        guess = _detect_version(preloaded[0])
+        versionsToTest = (
+            [guess] + [v for v in versionsToTest if v != guess]
+        )
+
     # Try to read as each of the versions to test, until we find one:
     for sv in versionsToTest:
         # try to read all new versions, if successful, return the results.
         # If unsuccessful, it will print a warning and try the next versionToTest
         try:
+            result = None
             if sv == 'VE11C':
-                return readVE11Cpmu(physio_file)
+                result = readVE11Cpmu(physio_file, preloaded=preloaded)
             elif sv == 'VB15A':
-                return readVB15Apmu(physio_file)
+                result = readVB15Apmu(physio_file, preloaded=preloaded)
             elif sv == 'VBX':
-                return readVBXpmu(physio_file)
+                result = readVBXpmu(physio_file, preloaded=preloaded)
+            # only memoize complete parses (a reader swapped out for a
+            #   stub --as in the tests-- returns None):
+            if cacheKey is not None and result is not None:
+                if len(_READ_CACHE) >= _READ_CACHE_MAXSIZE:
+                    # evict the oldest entry:
+                    _READ_CACHE.pop(next(iter(_READ_CACHE)))
+                _READ_CACHE[cacheKey] = result
+            return result
         except UnicodeDecodeError as e:
             # not an ascii file, so it's not a valid PMU file:
             raise PMUFormatError(
@@ -230,7 +371,7 @@ def readpmu(physio_file, softwareVersion=None, verbose=False):
         )
 
 
-def readVE11Cpmu(physio_file, forceRead=False):
+def readVE11Cpmu(physio_file, forceRead=False, preloaded=None):
     """
     Function to read the physiological signal from a VE11C Siemens PMU physio file
 
@@ -240,6 +381,9 @@ def readVE11Cpmu(physio_file, forceRead=False):
         path to a file with a Siemens PMU recording
     forceRead : bool
         flag indicating to read the file whether the format seems correct or not
+    preloaded : (bytes, list of str) or None
+        content of the file, as returned by _read_pmu_lines, in case the
+        caller has already read it (it saves re-reading the file)
 
     Returns
     -------
@@ -251,21 +395,21 @@ def readVE11Cpmu(physio_file, forceRead=False):
         MDHTime[1] gives the end   of the recording
     sampling_rate : int
         number of samples per second
-    physio_signal : list of int
+    physio_signal : np.ndarray of np.float32
         signal proper. NaN indicate points for which there was no recording
         (the scanner found a trigger in the signal)
     """
 
-    # Read the file, splitting by lines and removing the "newline" (and any blank space)
-    #   at the end of the line:
-    lines = [line.rstrip() for line in open(physio_file)]
+    # Read the first (data) line --as bytes-- separately from the (small,
+    #   decoded) trailing lines (unless the caller read the file already):
+    first_line, tail = preloaded if preloaded is not None else _read_pmu_lines(physio_file)
 
     # According to Siemens (IDEA documentation), the sampling rate is 2.5ms for all signals:
     sampling_rate = int(400)    # 1000/2.5
 
     # For that first line, different information regions are bound by "5002 and "6002".
     #   Find them:
-    s = re.split('5002(.*?)6002', lines[0])
+    s = _split_5002_6002(first_line)
     if len(s) == 1:
         # we failed to find even one "5002 ... 6002" group.
         raise PMUFormatError(
@@ -279,7 +423,8 @@ def readVE11Cpmu(physio_file, forceRead=False):
     #   compatibility with previous versions. Ignore it.
     # The second group tells us the type of signal ('RESP', 'PULS', etc.)
     try:
-        physio_type = re.search('LOGVERSION_([A-Z]*)', s[1]).group(1)
+        # only this small metadata region needs decoding to str:
+        physio_type = _RE_LOGVERSION.search(s[1].decode(errors='replace')).group(1)
     except AttributeError:
         print('Could not find type of recording for ' + physio_file)
         if not forceRead:
@@ -296,18 +441,20 @@ def readVE11Cpmu(physio_file, forceRead=False):
 
 
     # The third and fouth groups we ignore, and the fifth gives us the physio signal itself.
-    raw_signal = s[4].split(' ')
+    # Parse the tokens straight into an int array (split() also drops any
+    #   empty leading token), instead of building a huge list of str:
+    raw_signal = np.array(s[4].split(), dtype=np.int32)
 
     physio_signal = parserawPMUsignal(raw_signal)
 
     # The rest of the lines have statistics about the signals, plus start and finish times.
     # Get timing:
-    MPCUTime, MDHTime = getPMUtiming(lines[1:])
+    MPCUTime, MDHTime = getPMUtiming(tail)
 
     return physio_type, MDHTime, sampling_rate, physio_signal
 
 
-def readVB15Apmu(physio_file, forceRead=False):
+def readVB15Apmu(physio_file, forceRead=False, preloaded=None):
     """
     Function to read the physiological signal from a VB15A Siemens PMU physio file
     (e.g.: https://github.com/gitpan/App-AFNI-SiemensPhysio/blob/master/data/wpc4951_10824_20111108_110811.puls)
@@ -320,6 +467,9 @@ def readVB15Apmu(physio_file, forceRead=False):
         path to a file with a Siemens PMU recording
     forceRead : bool
         flag indicating to read the file whether the format seems correct or not
+    preloaded : (bytes, list of str) or None
+        content of the file, as returned by _read_pmu_lines, in case the
+        caller has already read it (it saves re-reading the file)
 
     Returns
     -------
@@ -331,21 +481,22 @@ def readVB15Apmu(physio_file, forceRead=False):
         MDHTime[1] gives the end   of the recording
     sampling_rate : int
         number of samples per second
-    physio_signal : list of int
+    physio_signal : np.ndarray of np.float32
         signal proper. NaN indicate points for which there was no recording
         (the scanner found a trigger in the signal)
     """
 
-    # Read the file, splitting by lines and removing the "newline" (and any blank space)
-    #   at the end of the line:
-    lines = [line.rstrip() for line in open(physio_file)]
+    # Read the first (data) line --as bytes-- separately from the (small,
+    #   decoded) trailing lines (unless the caller read the file already):
+    first_line, tail = preloaded if preloaded is not None else _read_pmu_lines(physio_file)
 
     # The first line starts with four integers with info about the recording, followed
-    #   by the data. So split by spaces:
-    line0 = lines[0].split()
+    #   by the data. So split by spaces and convert the whole line to int
+    #   in a single C-level pass (everything should be numeric):
+    line0 = first_line.split()
     try:
-        recInfo = [int(v) for v in line0[:4]]
-    except:
+        arr = np.array(line0, dtype=np.int32)
+    except ValueError:
         raise PMUFormatError(
                   'File %r does not seem to be a valid VB15A PMU file',
                   physio_file,
@@ -353,7 +504,8 @@ def readVB15Apmu(physio_file, forceRead=False):
                   str(line0[:4])
               )
 
-    raw_signal = line0[4:]     # we'll transform the signal to int later
+    recInfo = arr[:4].tolist()
+    raw_signal = arr[4:]       # the signal proper, already as int
 
     # According to Siemens (IDEA documentation), the sampling rate is 50 samples/s for all signals:
     sampling_rate = int(50)
@@ -376,7 +528,7 @@ def readVB15Apmu(physio_file, forceRead=False):
 
     # VB files continue with physio data right away. VE files continue with some more
     #   information, starting with the code "5002":
-    if raw_signal[0] == '5002':
+    if raw_signal.size and raw_signal[0] == 5002:
         raise PMUFormatError(
                   'File %r does not seem to be a valid VB15A PMU file',
                   physio_file,
@@ -388,12 +540,12 @@ def readVB15Apmu(physio_file, forceRead=False):
 
     # The rest of the lines have statistics about the signals, plus start and finish times.
     # Get timing:
-    MPCUTime, MDHTime = getPMUtiming(lines[1:])
+    MPCUTime, MDHTime = getPMUtiming(tail)
 
     return physio_type, MDHTime, sampling_rate, physio_signal
 
 
-def readVBXpmu(physio_file, forceRead=False):
+def readVBXpmu(physio_file, forceRead=False, preloaded=None):
     """
     Function to read the physiological signal from some VB Siemens PMU physio file
     (Possibly VB17? or VB19?)
@@ -406,6 +558,9 @@ def readVBXpmu(physio_file, forceRead=False):
         path to a file with a Siemens PMU recording
     forceRead : bool
         flag indicating to read the file whether the format seems correct or not
+    preloaded : (bytes, list of str) or None
+        content of the file, as returned by _read_pmu_lines, in case the
+        caller has already read it (it saves re-reading the file)
 
     Returns
     -------
@@ -417,18 +572,18 @@ def readVBXpmu(physio_file, forceRead=False):
         MDHTime[1] gives the end   of the recording
     sampling_rate : int
         number of samples per second
-    physio_signal : list of int
+    physio_signal : np.ndarray of np.float32
         signal proper. NaN indicate points for which there was no recording
         (the scanner found a trigger in the signal)
     """
 
-    # Read the file, splitting by lines and removing the "newline" (and any blank space)
-    #   at the end of the line:
-    lines = [line.rstrip() for line in open(physio_file)]
+    # Read the first (data) line --as bytes-- separately from the (small,
+    #   decoded) trailing lines (unless the caller read the file already):
+    first_line, tail = preloaded if preloaded is not None else _read_pmu_lines(physio_file)
 
     # For that first line, different information regions are bound by "5002 and "6002".
     #   Find them:
-    s = re.split('5002(.*?)6002', lines[0])
+    s = _split_5002_6002(first_line)
     if len(s) == 1:
         # we failed to find even one "5002 ... 6002" group.
         raise PMUFormatError(
@@ -441,9 +596,20 @@ def readVBXpmu(physio_file, forceRead=False):
     # The first group contains the triggering method, gate open and close times, etc for
     #   compatibility with previous versions. Ignore it.
     # The second group tells us the type of signal ('RESP', 'PULS', etc.)
-    try:
-        physio_type = re.search('Logging ([A-Z]*) signal', s[1]).group(1)
-    except AttributeError:
+    #   and the sampling rate. Both are extracted in a single left-to-right
+    #   scan (instead of one re.search pass per field):
+    physio_type = None
+    sampling_rate = None
+    # (only this small metadata region needs decoding to str)
+    for m in _RE_VBX_META.finditer(s[1].decode(errors='replace')):
+        if m.group(1) is not None:
+            physio_type = m.group(1)
+        elif m.group(2) is not None:
+            sampling_rate = int(m.group(2))
+        if physio_type is not None and sampling_rate is not None:
+            break
+
+    if physio_type is None:
         print('Could not find type of recording for ' + physio_file)
         if not forceRead:
             raise PMUFormatError(
@@ -457,10 +623,7 @@ def readVBXpmu(physio_file, forceRead=False):
             physio_type = "Unknown"
             # (continue reading the file)
 
-    # Also, the sampling rate:
-    try:
-        sampling_rate = int(re.search('_SAMPLES_PER_SECOND = ([0-9]*)', s[1]).group(1))
-    except AttributeError:
+    if sampling_rate is None:
         print('Could not find the sampling rate for ' + physio_file)
         raise PMUFormatError(
                   'File %r does not seem to be a valid VBX PMU file',
@@ -470,13 +633,15 @@ def readVBXpmu(physio_file, forceRead=False):
               )
 
     # The third group gives us the physio signal itself.
-    raw_signal = s[2].split(' ')
+    # Parse the tokens straight into an int array (split() also drops any
+    #   empty leading token), instead of building a huge list of str:
+    raw_signal = np.array(s[2].split(), dtype=np.int32)
 
     physio_signal = parserawPMUsignal(raw_signal)
 
     # The rest of the lines have statistics about the signals, plus start and finish times.
     # Get timing:
-    MPCUTime, MDHTime = getPMUtiming(lines[1:])
+    MPCUTime, MDHTime = getPMUtiming(tail)
 
     return physio_type, MDHTime, sampling_rate, physio_signal
 
@@ -504,59 +669,148 @@ def getPMUtiming(lines):
 
     MPCUTime = [0,0]
     MDHTime = [0,0]
+    found = 0
     for l in lines:
+        # cheap reject: all four keywords contain 'Time', most lines don't:
+        if 'Time' not in l:
+            continue
         if 'MPCUTime' in l:
             ls = l.split()
             if 'LogStart' in l:
                 MPCUTime[0]= int(ls[1])
+                found += 1
             elif 'LogStop' in l:
                 MPCUTime[1]= int(ls[1])
-        if 'MDHTime' in l:
+                found += 1
+        elif 'MDHTime' in l:
             ls = l.split()
             if 'LogStart' in l:
                 MDHTime[0]= int(ls[1])
+                found += 1
             elif 'LogStop' in l:
                 MDHTime[1]= int(ls[1])
+                found += 1
+        # stop scanning once all four timestamps are populated:
+        if found == 4:
+            break
 
     return MPCUTime, MDHTime
 
 
+if njit is not None:
+    @njit(cache=True)
+    def _finalize_signal(arr):
+        """
+        Fused single pass over the parsed int signal: finds the "5003"
+        end-of-recording marker and produces the NaN-marked float32
+        signal up to it in one read/write sweep (instead of the three
+        passes the boolean-mask version makes). Returns the signal and
+        the marker index (-1 if not found).
+        """
+        n = arr.shape[0]
+        end = -1
+        for i in range(n):
+            if arr[i] == 5003:
+                end = i
+                break
+        m = end if end >= 0 else n
+        out = np.empty(m, dtype=np.float32)
+        for i in range(m):
+            v = arr[i]
+            if v == 5000 or v == 6000:
+                out[i] = np.nan
+            else:
+                out[i] = v
+        return out, end
+else:
+    _finalize_signal = None
+
+
+def _tokens_to_int(signal):
+    """
+    Normalizes a raw PMU signal (list/array of str or bytes tokens, or of
+    ints) into an integer ndarray
+    """
+    arr = np.asarray(signal)
+    if arr.dtype.kind in 'US':
+        # Sometimes, there is an empty string ('') at the beginning of the string. Remove it:
+        if arr.size and arr[0] == '':
+            arr = arr[1:]
+        # Convert to integers (one C-level pass, rather than int() per token):
+        arr = arr.astype(np.int32)
+    return arr
+
+
+def _parse_pmu_tokens(signal):
+    """
+    Parses a raw PMU signal into an int32 array plus a boolean trigger
+    mask, without widening to float: consumers that only need a "trigger
+    happened here" mask can work on the compact integer signal.
+
+    Parameters
+    ----------
+    signal : list of str (or array-like of int)
+        raw PMU signal
+
+    Returns
+    -------
+    arr : np.ndarray of np.int32
+        parsed signal, cut at the "5003" end-of-recording marker (trigger
+        marker values are left in place)
+    trigger : np.ndarray of bool
+        True at the points where the scanner found a trigger
+    """
+
+    arr = _tokens_to_int(signal)
+
+    # only keep up to "5003" (indicates end of signal recording):
+    end = np.flatnonzero(arr == 5003)
+    if end.size:
+        arr = arr[:end[0]]
+    else:
+        print("Warning: End of physio recording not found. Keeping whole data")
+
+    # Values "5000" and "6000" indicate "trigger on" and "trigger off", respectively, so they
+    #   are not a real physio_signal value:
+    trigger = (arr == 5000) | (arr == 6000)
+
+    return arr, trigger
+
+
 def parserawPMUsignal(signal):
     """
     Function to parse raw physio signal.
 
     Parameters
     ----------
-    signal : list of str
-        list with raw PMU signal
+    signal : list of str (or array-like of int)
+        raw PMU signal
 
     Returns
     -------
-    signal : list of int
+    signal : np.ndarray of np.float32
         parsed signal. NaN indicate points for which there was no recording
         (the scanner found a trigger in the signal)
     """
 
-    # Sometimes, there is an empty string ('') at the beginning of the string. Remove it:
-    if signal[0] == '':
-        signal = signal[1:]
+    arr = _tokens_to_int(signal)
 
-    # Convert to integers:
-    signal = [int(v) for v in signal]
+    if _finalize_signal is not None:
+        # JIT-compiled kernel: end-marker search and NaN substitution in
+        #   a single fused pass:
+        physio_signal, end = _finalize_signal(np.ascontiguousarray(arr))
+        if end < 0:
+            print("Warning: End of physio recording not found. Keeping whole data")
+        return physio_signal
 
-    # only keep up to "5003" (indicates end of signal recording):
-    try:
-        signal = signal[:signal.index(5003)]
-    except ValueError:
-        print("Warning: End of physio recording not found. Keeping whole data")
+    arr, trigger = _parse_pmu_tokens(arr)
 
-    # Values "5000" and "6000" indicate "trigger on" and "trigger off", respectively, so they
-    #   are not a real physio_signal value. So replace them with NaN:
-    for idx, v in enumerate(signal):
-        if v == 5000 or v == 6000:
-            signal[idx] = float('NaN')
+    # The trigger points are not real physio_signal values, so we only
+    #   widen to float here, at the very end, to mark them with NaN:
+    physio_signal = arr.astype(np.float32)
+    physio_signal[trigger] = np.nan
 
-    return signal
+    return physio_signal
 
 
 def testSamplingRate(
@@ -0,0 +1,115 @@
+"""   Shared fixtures for the "pmu2bidsphysio.py" tests   """
+
+import sys
+
+import numpy as np
+import pytest
+
+from bidsphysio.pmu2bids import pmu2bidsphysio as p2bp
+from .utils import TESTS_DATA_PATH
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _check_data():
+    """
+    Checks once per session that all the tests data files are there,
+    instead of letting a missing file surface as a confusing parse
+    error somewhere downstream
+    """
+    required = [
+        'sample_VE11C.puls',
+        'sample_VE11C.resp',
+        'sample_VB15A.resp',
+        'sample_VBX.puls',
+        'pmu_VE11C_cardiac.tsv',
+        'pmu_VB15A_respiratory.tsv',
+        'pmu_VBX_cardiac.tsv',
+        'sample.acq',
+    ]
+    missing = [r for r in required if not (TESTS_DATA_PATH / r).exists()]
+    if missing:
+        pytest.skip('missing tests data files: {m}'.format(m=missing))
+
+
+@pytest.fixture(scope="session")
+def ve11c_parsed():
+    """
+    Parses the sample VE11C file just once for the whole session
+    """
+    return p2bp.readVE11Cpmu(str(TESTS_DATA_PATH / 'sample_VE11C.puls'))
+
+
+@pytest.fixture(scope="session")
+def vb15a_parsed():
+    """
+    Parses the sample VB15A file just once for the whole session
+    """
+    return p2bp.readVB15Apmu(str(TESTS_DATA_PATH / 'sample_VB15A.resp'))
+
+
+@pytest.fixture(scope="session")
+def vbx_parsed():
+    """
+    Parses the sample VBX file just once for the whole session
+    """
+    return p2bp.readVBXpmu(str(TESTS_DATA_PATH / 'sample_VBX.puls'))
+
+
+@pytest.fixture(scope="session")
+def expected_ve11c():
+    """
+    Expected VE11C cardiac signal (just its beginning), loaded once with
+    the C-level parser
+    """
+    return np.loadtxt(TESTS_DATA_PATH / 'pmu_VE11C_cardiac.tsv')
+
+
+@pytest.fixture(scope="session")
+def expected_vb15a():
+    """
+    Expected VB15A respiratory signal (just its beginning), loaded once
+    with the C-level parser
+    """
+    return np.loadtxt(TESTS_DATA_PATH / 'pmu_VB15A_respiratory.tsv')
+
+
+@pytest.fixture(scope="session")
+def expected_vbx():
+    """
+    Expected VBX cardiac signal, loaded once with the C-level parser
+    """
+    return np.loadtxt(TESTS_DATA_PATH / 'pmu_VBX_cardiac.tsv')
+
+
+@pytest.fixture(scope="session")
+def converted_bids_outdir(tmp_path_factory):
+    """
+    Runs the full PMU-to-BIDS conversion (through "main", so the output
+    directory gets created, etc.) just once for the whole session, and
+    returns the BIDS prefix it wrote to
+    """
+    infile1 = str(TESTS_DATA_PATH / 'sample_VE11C.puls')
+    infile2 = infile1[:-5] + '.resp'
+    outbids = str(tmp_path_factory.mktemp('pmu2bids') / 'mydir' / 'bids')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(sys, 'argv',
+                   ['pmu2bidsphysio', '-i', infile1, infile2, '-b', outbids])
+        p2bp.main()
+    return outbids
+
+
+@pytest.fixture(scope="session")
+def expected_errmsg_prefix():
+    """
+    Expected PMUFormatError message prefix when reading a wrong-format
+    file, per software version, built once for the whole session
+    """
+    return {
+        v: p2bp.errmsg(
+            'File %r does not seem to be a valid {sv} PMU file'.format(sv=v),
+            str(TESTS_DATA_PATH / wrong_file)
+        )
+        for v, wrong_file in [('VE11C', 'sample_VBX.puls'),
+                              ('VB15A', 'sample_VBX.puls'),
+                              ('VBX', 'sample_VE11C.puls')]
+    }
@@ -1,14 +1,13 @@
 """   Tests for the module "pmu2bidsphysio.py"   """
 
-import gzip
-import json
 from pathlib import Path
+import re
 import sys
 
+import numpy as np
 import pytest
 
 from bidsphysio.pmu2bids import pmu2bidsphysio as p2bp
-from bidsphysio.base.bidsphysio import PhysioData
 from bidsphysio.base.utils import check_bidsphysio_outputs
 from .utils import TESTS_DATA_PATH
 
@@ -28,6 +27,10 @@ MSG = 'Test: %r'
 PMUVE11CFILE = 'sample_VE11C.puls'
 PMUVB15AFILE = 'sample_VB15A.resp'
 PMUVBXFILE = 'sample_VBX.puls'
+# full paths, built just once for all the tests:
+PMUVE11C_PATH = str(TESTS_DATA_PATH / PMUVE11CFILE)
+PMUVB15A_PATH = str(TESTS_DATA_PATH / PMUVB15AFILE)
+PMUVBX_PATH = str(TESTS_DATA_PATH / PMUVBXFILE)
 EXPSTR = 'expected'
 GOTSTR = 'foo'
 
@@ -38,8 +41,8 @@ STOPMDHTIME = 39017760
 
 ###   Fixtures   ###
 
-@pytest.fixture
-def myErrmsg(scope="module"):
+@pytest.fixture(scope="module")
+def myErrmsg():
     """   myErrmsg   """
     return p2bp.errmsg(MSG, PMUVE11CFILE, EXPSTR, GOTSTR)
 
@@ -52,6 +55,8 @@ def mock_pmu2bidsphysio(monkeypatch):
        actually running anything: just the instructions in the runner
        before the call to pmu2bids
     """
+    # deferred import: only this fixture needs PhysioData
+    from bidsphysio.base.bidsphysio import PhysioData
 
     def mock_pmu2bids(*args, **kwargs):
         print('mock_pmu2bids called')
@@ -60,18 +65,35 @@ def mock_pmu2bidsphysio(monkeypatch):
     monkeypatch.setattr(p2bp, "pmu2bids", mock_pmu2bids)
 
 
+@pytest.fixture(scope="module")
+def dummy_pmu_files(tmp_path_factory):
+    """
+    Zero-byte stand-ins for the PMU input files of "test_main_args".
+    Because "pmu2bids" is mocked there, the paths only need to exist:
+    this way the runner test never reads the real sample files.
+    """
+    d = tmp_path_factory.mktemp('fake_pmu')
+    (d / 'a.puls').write_bytes(b'')
+    (d / 'b.puls').write_bytes(b'')
+    return str(d / 'a.puls'), str(d / 'b.puls')
+
+
+def _noop_readXXXXpmu(*args, **kwargs):
+    """   Stands in for readVE11Cpmu/readVB15Apmu/readVBXpmu   """
+    return
+
+
 @pytest.fixture
 def mock_readXXXXpmu_caller(monkeypatch):
     """
     Pretend we run readVE11Cpmu, readVB15Apmu or readVBXpmu, but do nothing
+    Note: deliberately function-scoped. A module-scoped monkeypatch is
+    only undone at module teardown, so the stubbed readers would leak
+    into the later end-to-end tests.
     """
-
-    def mock_readXXXXpmu(*args, **kwargs):
-        return
-
-    monkeypatch.setattr(p2bp, 'readVE11Cpmu', mock_readXXXXpmu)
-    monkeypatch.setattr(p2bp, 'readVB15Apmu', mock_readXXXXpmu)
-    monkeypatch.setattr(p2bp, 'readVBXpmu', mock_readXXXXpmu)
+    monkeypatch.setattr(p2bp, 'readVE11Cpmu', _noop_readXXXXpmu)
+    monkeypatch.setattr(p2bp, 'readVB15Apmu', _noop_readXXXXpmu)
+    monkeypatch.setattr(p2bp, 'readVBXpmu', _noop_readXXXXpmu)
 
 
 ###   Tests   ###
@@ -96,9 +118,8 @@ def test_PMUFormatError_class(myErrmsg):
     """
     myError = p2bp.PMUFormatError(MSG, PMUVE11CFILE, EXPSTR, GOTSTR)
     assert isinstance(myError, p2bp.PMUFormatError)
-    with pytest.raises(p2bp.PMUFormatError) as err_info:
+    with pytest.raises(p2bp.PMUFormatError, match=re.escape(myErrmsg)):
         raise myError
-    assert str(err_info.value) == myErrmsg
 
 
 def test_parserawPMUsignal(capfd):
@@ -110,16 +131,20 @@ def test_parserawPMUsignal(capfd):
     raw_signal = ['', '1733', '1725', '1725', '1721', '1721', '1718']
     psignal = p2bp.parserawPMUsignal(raw_signal)
     assert capfd.readouterr().out.startswith('Warning: End of physio recording not found')
-    assert float('NaN') not in psignal
+    assert not np.isnan(np.asarray(psignal, dtype=float)).any()
     # make sure it returns all the values, except for the first empty one:
-    assert psignal == [int(i) for i in raw_signal[1:]]
+    assert psignal.tolist() == [int(i) for i in raw_signal[1:]]
 
     # 2) simulated raw signal with '5003' and with '5000' and '6000', to indicate "trigger on" and "trigger off":
     raw_signal = ['1733', '5000', '1725', '6000', '1721', '5003', '1718']
     psignal = p2bp.parserawPMUsignal(raw_signal)
     assert 5000 not in psignal
     assert 6000 not in psignal
-    assert psignal == pytest.approx([1733, float('NaN'), 1725, float('NaN'), 1721], nan_ok=True)
+    assert np.allclose(
+        np.asarray(psignal, dtype=float),
+        np.array([1733, np.nan, 1725, np.nan, 1721]),
+        equal_nan=True
+    )
 
 
 def test_getPMUtiming():
@@ -149,103 +174,73 @@ def test_getPMUtiming():
     )
 
 
-def test_readVE11Cpmu():
-    """
-    Tests for readVE11Cpmu
-    """
-
-    # 1) If you test with a file with the wrong format, you should get a PMUFormatError
-    with pytest.raises(p2bp.PMUFormatError) as err_info:
-        physio_file = str(TESTS_DATA_PATH / PMUVBXFILE)
-        p2bp.readVE11Cpmu(physio_file)
-    assert str(err_info.value).startswith(
-        p2bp.errmsg(
-            'File %r does not seem to be a valid {sv} PMU file'.format(sv='VE11C'),
-            physio_file
-        )
-    )
-
-    # 2) With the correct file format, you get the expected results:
-    physio_file = str(TESTS_DATA_PATH / PMUVE11CFILE)
-
-    physio_type, MDHTime, sampling_rate, physio_signal = p2bp.readVE11Cpmu(physio_file)
-    assert physio_type == 'PULS'
-    assert MDHTime == [STARTMDHTIME, STOPMDHTIME]
-    assert sampling_rate == 400
-    with open(TESTS_DATA_PATH / ('pmu_VE11C_cardiac.tsv'), 'rt') as expected:
-        for expected_line, returned_signal in zip(expected, physio_signal):
-            assert float(expected_line) == returned_signal
-
-
-def test_readVB15Apmu():
-    """
-    Tests for readVB15Apmu
-    """
-
-    # 1) If you test with a file with the wrong format, you should get a PMUFormatError
-    with pytest.raises(p2bp.PMUFormatError) as err_info:
-        physio_file = str(TESTS_DATA_PATH / PMUVBXFILE)
-        p2bp.readVB15Apmu(physio_file)
-    assert str(err_info.value).startswith(
-        p2bp.errmsg(
-            'File %r does not seem to be a valid {sv} PMU file'.format(sv='VB15A'),
-            physio_file
-        )
-    )
-
-    # 2) With the correct file format, you get the expected results:
-    physio_file = str(TESTS_DATA_PATH / PMUVB15AFILE)
-
-    physio_type, MDHTime, sampling_rate, physio_signal = p2bp.readVB15Apmu(physio_file)
-    assert physio_type == 'RESP'
-    assert MDHTime == [57335095, 60647840]
-    assert sampling_rate == 50
-    with open(TESTS_DATA_PATH / ('pmu_VB15A_respiratory.tsv'), 'rt') as expected:
-        for expected_line, returned_signal in zip(expected, physio_signal):
-            assert float(expected_line) == returned_signal
-
-
-def test_readVBXpmu():
+# one entry per supported software version:
+# (reader name, version, wrong-format file, parsed fixture,
+#  expected-signal fixture, type, MDHTime, sampling rate)
+READ_VERSION_PARAMS = [
+    ('readVE11Cpmu', 'VE11C', PMUVBX_PATH, 've11c_parsed', 'expected_ve11c',
+     'PULS', [STARTMDHTIME, STOPMDHTIME], 400),
+    ('readVB15Apmu', 'VB15A', PMUVBX_PATH, 'vb15a_parsed', 'expected_vb15a',
+     'RESP', [57335095, 60647840], 50),
+    ('readVBXpmu', 'VBX', PMUVE11C_PATH, 'vbx_parsed', 'expected_vbx',
+     'PULSE', [47029710, 47654452], 50),
+]
+
+
+@pytest.mark.parametrize(
+    'read_fn_name,version,wrong_file,parsed_fixture,expected_fixture,'
+    'expected_type,expected_MDHTime,expected_sampling_rate',
+    READ_VERSION_PARAMS,
+    ids=[p[1] for p in READ_VERSION_PARAMS]
+)
+def test_read_version_pmu(
+        request,
+        expected_errmsg_prefix,
+        read_fn_name,
+        version,
+        wrong_file,
+        parsed_fixture,
+        expected_fixture,
+        expected_type,
+        expected_MDHTime,
+        expected_sampling_rate
+):
     """
-    Tests for readVBXpmu
+    Tests for readVE11Cpmu, readVB15Apmu and readVBXpmu
+    (the three readers share the same harness, parametrized per version)
     """
+    read_fn = getattr(p2bp, read_fn_name)
 
     # 1) If you test with a file with the wrong format, you should get a PMUFormatError
-    with pytest.raises(p2bp.PMUFormatError) as err_info:
-        physio_file = str(TESTS_DATA_PATH / PMUVE11CFILE)
-        p2bp.readVBXpmu(physio_file)
-    assert str(err_info.value).startswith(
-        p2bp.errmsg(
-            'File %r does not seem to be a valid {sv} PMU file'.format(sv='VBX'),
-            physio_file
-        )
+    #    (pytest matches the message itself, no post-hoc str() needed):
+    with pytest.raises(p2bp.PMUFormatError,
+                       match=re.escape(expected_errmsg_prefix[version])):
+        read_fn(wrong_file)
+
+    # 2) With the correct file format, you get the expected results
+    #    (parsed just once, by the session-scoped fixtures):
+    physio_type, MDHTime, sampling_rate, physio_signal = \
+        request.getfixturevalue(parsed_fixture)
+    expected = request.getfixturevalue(expected_fixture)
+    assert physio_type == expected_type
+    assert MDHTime == expected_MDHTime
+    assert sampling_rate == expected_sampling_rate
+    # single vectorized comparison (the expected file only holds the
+    #    beginning of the signal):
+    np.testing.assert_allclose(
+        np.asarray(physio_signal[:len(expected)], dtype=float),
+        expected
     )
 
-    # 2) With the correct file format, you get the expected results:
-    physio_file = str(TESTS_DATA_PATH / PMUVBXFILE)
-
-    physio_type, MDHTime, sampling_rate, physio_signal = p2bp.readVBXpmu(physio_file)
-    assert physio_type == 'PULSE'
-    assert MDHTime == [47029710, 47654452]
-    assert sampling_rate == 50
-    with open(TESTS_DATA_PATH / ('pmu_VBX_cardiac.tsv'), 'rt') as expected:
-        for expected_line, returned_signal in zip(expected, physio_signal):
-            assert float(expected_line) == returned_signal
 
-
-def test_main_args(
+def test_main_args_infile_not_found(
         monkeypatch,
         tmpdir,
-        mock_pmu2bidsphysio,
-        capfd
+        mock_pmu2bidsphysio
 ):
     """
-    Tests for "main"
-    Just check the arguments, etc. We'll test the call to pmu2bids in a
-    separated function
+    Tests for "main" when "infile" doesn't exist
     """
-    # 1) "infile" doesn't exist:
-    # Note: we enter "-i" last because in 3), we'll be adding a second file
     infile = str(tmpdir / 'boo.dcm')
     args = (
         'pmu2bidsphysio -b {bp} -i {infile}'.format(
@@ -259,45 +254,66 @@ def test_main_args(
     assert str(e_info.value).endswith(' file not found')
     assert str(e_info.value).split(' file not found')[0] == infile
 
-    # 2) "infile" does exist, but output directory doesn't exist:
-    #    The output directory should be created and the "pmu2bids" function should be called
-    args[args.index('-i') + 1] = str(TESTS_DATA_PATH / PMUVE11CFILE)
-    monkeypatch.setattr(sys, 'argv', args)
-    p2bp.main()
-    assert (tmpdir / 'mydir').exists()
-    assert capfd.readouterr().out == 'mock_pmu2bids called\n'
 
-    # 3) "infile" contains more than one file:
-    args.append(
-        str(TESTS_DATA_PATH / PMUVBXFILE)
-    )
+@pytest.mark.parametrize('n_infiles', [1, 2], ids=['one_infile', 'two_infiles'])
+def test_main_args(
+        monkeypatch,
+        tmpdir,
+        mock_pmu2bidsphysio,
+        dummy_pmu_files,
+        capfd,
+        n_infiles
+):
+    """
+    Tests for "main"
+    Just check the arguments, etc. We'll test the call to pmu2bids in a
+    separated function.
+    The output directory doesn't exist, so it should be created and the
+    "pmu2bids" function should be called ("pmu2bids" is mocked, so
+    zero-byte dummy files are enough). "main" is invoked just once per
+    scenario: with a single "infile" and with more than one.
+    """
+    args = [
+        'pmu2bidsphysio',
+        '-b', str(tmpdir / 'mydir' / 'foo'),
+        '-i', *dummy_pmu_files[:n_infiles]
+    ]
     monkeypatch.setattr(sys, 'argv', args)
     # Make sure 'main' runs without errors:
     assert p2bp.main() is None
+    assert (tmpdir / 'mydir').exists()
+    assert capfd.readouterr().out == 'mock_pmu2bids called\n'
 
 
-def test_testSamplingRate():
-    """   Tests for testSamplingRate   """
-
-    # 1) If the tolerance is wrong, we should get an error
-    for t in [-0.5, 5]:
-        with pytest.raises(ValueError) as err_info:
-            p2bp.testSamplingRate(tolerance=t)
-        assert str(err_info.value) == 'tolerance has to be between 0 and 1. Got ' + str(t)
-
-    # 2) If the sampling rate is incorrect (allowing for default tolerance),
-    #    we should also get an error:
-    #    Note that the logTimes are in ms, and the sampling rate in samples per sec
-    with pytest.raises(ValueError) as err_info:
+@pytest.mark.parametrize('bad_tol', [-0.5, 5])
+def test_testSamplingRate_bad_tolerance(bad_tol):
+    """   testSamplingRate: an out-of-range tolerance raises an error   """
+    with pytest.raises(
+            ValueError,
+            match=re.escape('tolerance has to be between 0 and 1. Got ' + str(bad_tol))
+    ):
+        p2bp.testSamplingRate(tolerance=bad_tol)
+
+
+def test_testSamplingRate_wrong_rate():
+    """
+    testSamplingRate: an incorrect sampling rate (allowing for the default
+    tolerance) also raises an error.
+    Note that the logTimes are in ms, and the sampling rate in samples per sec
+    """
+    with pytest.raises(ValueError, match='sampling rate'):
         p2bp.testSamplingRate(
             sampling_rate=1,
             Nsamples=100,
             logTimes=[0, 10000]
         )
-    assert 'sampling rate' in str(err_info.value)
 
-    # 3) If the sampling rate is correct (within the default tolerance),
-    #    we should NOT get an error:
+
+def test_testSamplingRate():
+    """
+    testSamplingRate: a correct sampling rate (within the default
+    tolerance) should NOT give an error
+    """
     assert p2bp.testSamplingRate(
         sampling_rate=10,
         Nsamples=99,
@@ -311,33 +327,33 @@ def test_readpmu_with_incorrect_file():
     Given an input file from any PMU software version, check that it is saved to bids
     """
 
-    physio_file = str(TESTS_DATA_PATH / PMUVBXFILE)
+    physio_file = PMUVBX_PATH
 
     # 1) If you call it with an unknown PMU software version, raise an error:
-    with pytest.raises(Exception) as err_info:
+    with pytest.raises(Exception,
+                       match=re.escape("Vfoo is not a known software version.")):
         p2bp.readpmu(physio_file, 'Vfoo')
-    assert str(err_info.value) == "Vfoo is not a known software version."
 
     # 2) If you test with a file with the wrong format, you should get a PMUFormatError
     softwareVersionToRead = 'VE11C'
-    with pytest.raises(p2bp.PMUFormatError) as err_info:
-        p2bp.readpmu(physio_file, softwareVersion=softwareVersionToRead)
-    assert str(err_info.value) == p2bp.errmsg(
+    expected = p2bp.errmsg(
         'File %r does not seem to be a valid Siemens {sv} PMU file'.format(sv=softwareVersionToRead),
         physio_file
     )
+    with pytest.raises(p2bp.PMUFormatError, match=re.escape(expected)):
+        p2bp.readpmu(physio_file, softwareVersion=softwareVersionToRead)
 
     # 3) If you test with an ASCII file that is not a PMU file at all, or
     #    with a binaryfile, you should get a PMUFormatError
     ascii_file = str(TESTS_DATA_PATH / 'pmu_VBX_cardiac.tsv')
     binary_file = str(TESTS_DATA_PATH / 'sample.acq')
     for f in [ascii_file, binary_file]:
-        with pytest.raises(p2bp.PMUFormatError) as err_info:
-            p2bp.readpmu(f)
-        assert str(err_info.value) == p2bp.errmsg(
+        expected = p2bp.errmsg(
             'File %r does not seem to be a valid Siemens PMU file',
             f
         )
+        with pytest.raises(p2bp.PMUFormatError, match=re.escape(expected)):
+            p2bp.readpmu(f)
 
 
 def test_readpmu(
@@ -352,52 +368,21 @@ def test_readpmu(
     """
 
     # Specifying the (correct) version:
-    assert p2bp.readpmu(
-        str(TESTS_DATA_PATH / PMUVBXFILE),
-        softwareVersion='VBX'
-    ) is None
-    assert p2bp.readpmu(
-        str(TESTS_DATA_PATH / PMUVE11CFILE),
-        softwareVersion='VE11C'
-    ) is None
+    assert p2bp.readpmu(PMUVBX_PATH, softwareVersion='VBX') is None
+    assert p2bp.readpmu(PMUVE11C_PATH, softwareVersion='VE11C') is None
 
     # Default mode: try all known versions:
-    for f in [
-        str(TESTS_DATA_PATH / PMUVBXFILE),
-        str(TESTS_DATA_PATH / PMUVE11CFILE)
-    ]:
+    for f in [PMUVBX_PATH, PMUVE11C_PATH]:
         assert p2bp.readpmu(f) is None
 
 
-def test_pmu2bids(
-        monkeypatch,
-        tmpdir,
-        capfd
-):
+def test_pmu2bids(converted_bids_outdir):
     """
     Tests for the call to "pmu2bids"
-    We will call it by calling "main" to make sure the output directory
-    is created, etc.
+    The conversion itself (through "main", so the output directory is
+    created, etc.) is run just once, by the session-scoped fixture.
     """
-    infile1 = str(TESTS_DATA_PATH / PMUVE11CFILE)
-    infile2 = infile1[:-5] + '.resp'
-    outbids = str(tmpdir / 'mydir' / 'bids')
-
-    args = (
-        'pmu2bidsphysio -i {infiles} -b {bp}'.format(
-            infiles=infile1 + ' ' + infile2,
-            bp=outbids
-        )
-    ).split(' ')
-    monkeypatch.setattr(sys, 'argv', args)
-
-    # call "main" (which will create the output dir and call "pmu2bids"):
-    p2bp.main()
-
-    # make sure we are not calling the mock_dcm2bidds, but the real one:
-    assert capfd.readouterr().out != 'mock_pmu2bids called\n'
-
     # Check that we have as many signals as expected (2 in this case):
-    check_bidsphysio_outputs(outbids,
+    check_bidsphysio_outputs(converted_bids_outdir,
                              [['cardiac'], ['respiratory']],
                              TESTS_DATA_PATH / 'pmu_VE11C_')
@@ -36,6 +36,7 @@ TESTS_REQUIRES = [
 ]
 
 EXTRA_REQUIRES = {
+    'numba': ['numba'],       # JIT-compiled onset synchronization (optional)
     'tests': TESTS_REQUIRES,
 }
 
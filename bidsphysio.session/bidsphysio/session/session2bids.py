@@ -17,10 +17,12 @@ file type independent.
 Based on Taylor Salo's conversion.py:
 https://github.com/tsalo/phys2bids/blob/eb46a71d7881c4dcd0c5e70469d88cb99bb01f1c/phys2bids/conversion.py
 """
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+import gzip
 import os
 import os.path as op
 import tarfile
-from tempfile import TemporaryDirectory
 
 from bids import BIDSLayout
 import pandas as pd
@@ -30,6 +32,56 @@ import matplotlib.pyplot as plt
 
 from bidsphysio.base.bidsphysio import PhysioData
 
+# numba (optional) JIT-compiles the offset-scoring core of
+# "synchronize_onsets"; without it we keep the vectorized NumPy path
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    @njit(cache=True)
+    def _score_candidates(onset_diffs):
+        """
+        Returns the flat index of the candidate offset that minimizes
+        the sum, over physios, of the distance to the closest scan.
+        Single fused pass over the onset-diff matrix, no temporaries.
+        """
+        n_scans, n_phys = onset_diffs.shape
+        best_sum = np.inf
+        best_flat = 0
+        flat = 0
+        for i in range(n_scans):
+            for j in range(n_phys):
+                off = onset_diffs[i, j]
+                total = 0.0
+                for c in range(n_phys):
+                    closest = np.inf
+                    for r in range(n_scans):
+                        d = abs(onset_diffs[r, c] - off)
+                        if d < closest:
+                            closest = d
+                    total += closest
+                if total < best_sum:
+                    best_sum = total
+                    best_flat = flat
+                flat += 1
+        return best_flat
+else:
+    _score_candidates = None
+
+
+@lru_cache(maxsize=4)
+def _get_layout(bids_dir):
+    """Returns the (cached) BIDSLayout for a dataset.
+
+    Indexing a dataset is one of the most expensive pybids operations,
+    so when several sessions of the same study are converted in a row
+    we only pay for it once.
+    """
+    return BIDSLayout(bids_dir)
+
 
 def compress_physio(physio_file, out_prefix, get_physio_acq_time, overwrite):
     """Archives a physiological file into a tarball
@@ -62,9 +114,9 @@ def compress_physio(physio_file, out_prefix, get_physio_acq_time, overwrite):
     if op.exists(outtar) and not overwrite:
         print("File {} already exists, will not overwrite".format(outtar))
         return
-    # tarfile encodes current time.time inside, making those non-
-    # reproducible, so we should use the earliest_marker_created_at
-    # of the acq_file
+    # tarfile encodes current time.time inside the gzip header, making
+    # those non-reproducible, so we should use the
+    # earliest_marker_created_at of the acq_file
 
     # return physio file acquisition time as a float (like in
     # the method time.time()):
@@ -75,27 +127,21 @@ def compress_physio(physio_file, out_prefix, get_physio_acq_time, overwrite):
         ti.mtime = acq_time
         return ti
 
-    # poor man mocking since can't rely on having mock
-    try:
-        import time
-        _old_time = time.time
-        time.time = lambda: acq_time
-        if op.lexists(outtar):
-            os.unlink(outtar)
-        with tarfile.open(outtar, 'w:gz', dereference=True) as tar:
-            tmpdir = TemporaryDirectory()
-            outfile = op.join(tmpdir.name, op.basename(physio_file))
-            if not op.islink(outfile):
-                os.symlink(op.realpath(physio_file), outfile)
-            # place into archive stripping any lead directories and
-            # adding the one corresponding to prefix
-            tar.add(outfile,
-                    arcname=op.join(op.basename(out_prefix),
-                                    op.basename(outfile)),
-                    recursive=False,
-                    filter=_assign_acq_time)
-    finally:
-        time.time = _old_time
+    if op.lexists(outtar):
+        os.unlink(outtar)
+    # wrap the gzip stream ourselves, with the acquisition time as its
+    # mtime, and add the file directly with a computed arcname (stripping
+    # any lead directories and adding the one corresponding to prefix),
+    # so no tempdir/symlink indirection or time.time patching is needed:
+    with open(outtar, 'wb') as outfileobj:
+        with gzip.GzipFile(filename='', mode='wb', fileobj=outfileobj,
+                           mtime=acq_time) as gz:
+            with tarfile.open(fileobj=gz, mode='w') as tar:
+                tar.add(op.realpath(physio_file),
+                        arcname=op.join(op.basename(out_prefix),
+                                        op.basename(physio_file)),
+                        recursive=False,
+                        filter=_assign_acq_time)
 
     return outtar
 
@@ -134,61 +180,79 @@ def synchronize_onsets(phys_df, scan_df):
     scan_df.index = range(scan_df.shape[0])   # overwrite the run number
 
     # Get difference between each physio trigger onset and each scan onset
-    onset_diffs = np.zeros((scan_df.shape[0], phys_df.shape[0]))
-    for i, i_scan in scan_df.iterrows():
-        for j, j_phys in phys_df.iterrows():
-            onset_diff = j_phys['onset'] - i_scan['onset']
-            onset_diffs[i, j] = onset_diff
+    # (a single broadcast instead of a Python loop per cell):
+    phys_onsets = phys_df['onset'].to_numpy(dtype=np.float64)
+    scan_onsets = scan_df['onset'].to_numpy(dtype=np.float64)
+    onset_diffs = phys_onsets[None, :] - scan_onsets[:, None]
 
     # Find the delay that gives the smallest difference between scan onsets
-    # and physio onsets
-    selected = (None, None)
-    thresh = 1000
-    for i_scan in range(onset_diffs.shape[0]):
-        for j_phys in range(onset_diffs.shape[1]):
-            test_offset = onset_diffs[i_scan, j_phys]
-            diffs_from_phys_onset = onset_diffs - test_offset
-            diffs_from_abs = np.abs(diffs_from_phys_onset)
-            min_diff_row_idx = np.argmin(diffs_from_abs, axis=0)
-            min_diff_col_idx = np.arange(len(min_diff_row_idx))
-            min_diffs = diffs_from_abs[min_diff_row_idx, min_diff_col_idx]
-            min_diff_sum = np.sum(min_diffs)
-            if min_diff_sum < thresh:
-                selected = (i_scan, j_phys)
-                thresh = min_diff_sum
+    # and physio onsets. Every entry of "onset_diffs" is a candidate offset
+    # and they are all scored at once (for each candidate: sum, over
+    # physios, of the distance to the closest scan). The closest scan per
+    # column is found by binary search over a pre-sorted copy of the
+    # column, so scoring is O(candidates x physios x log(scans)) rather
+    # than re-scanning every row per candidate. For the small matrices
+    # typical of a session, the (optional) numba kernel fuses the whole
+    # search into one pass with no per-kernel dispatch overhead:
+    if _score_candidates is not None:
+        best_flat = _score_candidates(np.ascontiguousarray(onset_diffs))
+    else:
+        candidates = onset_diffs.reshape(-1)
+        sorted_diffs = np.sort(onset_diffs, axis=0)
+        n_scans = sorted_diffs.shape[0]
+        min_diff_sums = np.zeros(candidates.size)
+        for col in sorted_diffs.T:      # one column (physio) at a time
+            pos = np.searchsorted(col, candidates)
+            below = col[np.clip(pos - 1, 0, n_scans - 1)]
+            above = col[np.clip(pos, 0, n_scans - 1)]
+            min_diff_sums += np.minimum(np.abs(below - candidates),
+                                        np.abs(above - candidates))
+        best_flat = np.argmin(min_diff_sums)
+    selected = np.unravel_index(best_flat, onset_diffs.shape)
 
     offset = onset_diffs[selected[0], selected[1]]
 
     # Isolate close, but negative relative onsets, to ensure scan onsets are
     # always before or at physio triggers.
     close_thresh = 2  # threshold for "close" onsets, in seconds
-    diffs_from_phys_onset = onset_diffs - offset
-    min_diff_row_idx = np.argmin(np.abs(diffs_from_phys_onset), axis=0)
+    # 'onset_diffs' is not needed beyond this point, so subtract in place
+    # and keep a single scratch buffer for the abs pass, instead of
+    # allocating a fresh temporary for every kernel:
+    diffs_from_phys_onset = np.subtract(onset_diffs, offset, out=onset_diffs)
+    abs_diffs = np.abs(diffs_from_phys_onset, out=np.empty_like(onset_diffs))
+    min_diff_row_idx = abs_diffs.argmin(axis=0)
     min_diff_col_idx = np.arange(len(min_diff_row_idx))
     min_diffs = diffs_from_phys_onset[min_diff_row_idx, min_diff_col_idx]
-    min_diffs_tmp = min_diffs[abs(min_diffs) <= close_thresh]
-    min_val = min(min_diffs_tmp)
+    min_diffs_tmp = min_diffs[np.abs(min_diffs) <= close_thresh]
+    min_val = min_diffs_tmp.min()
     min_diffs += min_val
     offset += min_val
     print('Scan DF should be adjusted forward by {} seconds'.format(offset))
 
     # Find the filename of the scan the 'onset' of which is close to
-    # the 'physio_onset' (if none is close enough, enter None):
+    # the 'physio_onset' (if none is close enough, enter None).
+    # Both onset columns are sorted, so instead of scanning the whole
+    # 'scan_df' with a boolean mask per physio onset, binary-search the
+    # insertion point and check just the two neighboring scans:
     scan_df['phys_onset'] = scan_df['onset'] + offset
-    scan_fnames = []
-    for p_on in phys_df['onset']:
-        corresponding_scan = scan_df.loc[
-            abs(scan_df['phys_onset'] - p_on) < close_thresh,
-            'filename'
-        ]
-        if len(corresponding_scan) == 0:
-            scan_fnames.append(None)
-        else:
-            # append the scan filename
-            scan_fnames.append(corresponding_scan.iloc[0])
+    adj_scan_onsets = scan_df['phys_onset'].to_numpy(dtype=np.float64)
+    fnames = scan_df['filename'].to_numpy()
+    insert_idx = np.searchsorted(adj_scan_onsets, phys_onsets)
+    cand = np.clip(np.stack([insert_idx - 1, insert_idx]),
+                   0, len(adj_scan_onsets) - 1)
+    cand_diffs = np.abs(adj_scan_onsets[cand] - phys_onsets)
+    best = cand_diffs.argmin(axis=0)
+    cols = np.arange(len(phys_onsets))
+    scan_fnames = [
+        fnames[c] if close else None
+        for c, close in zip(cand[best, cols],
+                            cand_diffs[best, cols] < close_thresh)
+    ]
 
-    # Add the scan filenames to the phys_df:
-    phys_df['scan_fname'] = [sf for sf in scan_fnames]
+    # Add the scan filenames to the phys_df (as 'object', so the
+    # unmatched entries stay None):
+    phys_df['scan_fname'] = pd.Series(scan_fnames, dtype=object,
+                                      index=phys_df.index)
     return phys_df
 
 
@@ -285,16 +349,39 @@ def determine_scan_durations(layout, scan_df, sub, ses):
     func_files = layout.get(datatype='func', suffix='bold',
                             extension=['nii.gz', 'nii'],
                             subject=sub, session=ses)
-    scan_df['duration'] = None
+    # collect the durations in a dict keyed on filename and assign the
+    # column in one shot, instead of scanning 'scan_df' with a .loc
+    # boolean mask for every file:
+    known_fnames = set(scan_df['filename'])
+    to_read = []
     for func_file in func_files:
-        filename = func_file.path
-        if filename in scan_df['filename'].values:
-            n_vols = nib.load(func_file.path).shape[3]
-            tr = func_file.get_metadata()['RepetitionTime']
-            duration = n_vols * tr
-            scan_df.loc[scan_df['filename'] == filename, 'duration'] = duration
+        if func_file.path in known_fnames:
+            to_read.append(func_file)
         else:
-            print('Skipping {}'.format(filename))
+            print('Skipping {}'.format(func_file.path))
+
+    # the metadata lookups all go through the layout's single SQLAlchemy
+    # session, which is not thread-safe, so fetch the TRs serially (they
+    # are cheap sqlite queries):
+    trs = [func_file.get_metadata()['RepetitionTime'] for func_file in to_read]
+
+    def _n_vols(func_file):
+        # get_data_shape comes straight from the header, so the
+        # image data (potentially GBs, gzipped) is never read:
+        return nib.load(func_file.path).header.get_data_shape()[3]
+
+    # the header reads are I/O bound, so overlap them, one worker per file:
+    if len(to_read) > 1:
+        with ThreadPoolExecutor(
+                max_workers=min(len(to_read), os.cpu_count())
+        ) as executor:
+            n_vols = list(executor.map(_n_vols, to_read))
+    else:
+        n_vols = [_n_vols(f) for f in to_read]
+    durations = {f.path: n * tr for f, n, tr in zip(to_read, n_vols, trs)}
+    # keep the column float64 (unmatched scans get NaN, not None), so the
+    # dropna downstream runs on a homogeneous numeric column:
+    scan_df['duration'] = scan_df['filename'].map(durations).astype(np.float64)
     return scan_df
 
 
@@ -356,7 +443,8 @@ def load_scan_data(layout, sub, ses):
 def convert_session(physio_files, bids_dir, sub, ses=None,
                     get_physio_data=None,
                     get_physio_acq_time=None,
-                    outdir=None, overwrite=False):
+                    outdir=None, overwrite=False,
+                    layout=None):
     """Function to save the physiology data in a given folder as BIDS,
     matching the filenames from the study imaging files
 
@@ -382,12 +470,25 @@ def convert_session(physio_files, bids_dir, sub, ses=None,
         Default: bids_dir
     overwrite : bool
       Overwrite existing tarfiles
+    layout : bids.layout.BIDSLayout or None, optional
+        Pre-built layout of the BIDS dataset. If None, it is built (and
+        cached) from bids_dir.
     """
 
     # Default out_dir is bids_dir:
     outdir = outdir or bids_dir
 
-    file_times = [get_physio_acq_time(f) for f in physio_files]
+    # "get_physio_acq_time" typically re-parses the physio file (e.g.,
+    # with bioread), and "compress_physio" asks for the time again at the
+    # end, so memoize the result per file and parse only once:
+    acq_time_cache = {}
+
+    def _cached_acq_time(physio_file):
+        if physio_file not in acq_time_cache:
+            acq_time_cache[physio_file] = get_physio_acq_time(physio_file)
+        return acq_time_cache[physio_file]
+
+    file_times = [_cached_acq_time(f) for f in physio_files]
     # relative to the first one:
     rel_file_times = [(f - min(file_times)).total_seconds() for f in file_times]
 
@@ -421,37 +522,45 @@ def convert_session(physio_files, bids_dir, sub, ses=None,
     )
 
     # Now, for the scanner timing:
-    layout = BIDSLayout(bids_dir)
+    layout = layout or _get_layout(bids_dir)
     df = load_scan_data(layout, sub=sub, ses=ses)
 
     out_df = synchronize_onsets(physio_df, df)
 
     sourcedir = op.join(outdir, 'sourcedata')
-    if not op.isdir(sourcedir):
-        os.makedirs(sourcedir)
+    os.makedirs(sourcedir, exist_ok=True)
     sub_ses_dir = op.join('sub-' + sub, ('ses-' + str(ses)) if ses else '')
 
     for (phys_file, phys_data, scan_file) in zip(out_df['filename'], out_df['data'], out_df['scan_fname']):
         if scan_file:
             prefix = op.join(sub_ses_dir, scan_file.split('.nii')[0])
             outdir_ = op.join(outdir, op.dirname(prefix))
-            if not op.isdir(outdir_):
-                os.makedirs(outdir_)
+            os.makedirs(outdir_, exist_ok=True)
             phys_data.save_to_bids_with_trigger(op.join(outdir, prefix))
             sourcedir_ = op.join(sourcedir, op.dirname(prefix))
-            if not op.isdir(sourcedir_):
-                os.makedirs(sourcedir_)
+            os.makedirs(sourcedir_, exist_ok=True)
             compress_physio(phys_file,
                             op.join(sourcedir_, op.basename(prefix)),
-                            get_physio_acq_time,
+                            _cached_acq_time,
                             overwrite=overwrite)
 
 
+def _load_edf_file(physio_file, get_physio_data, get_event_data,
+                   get_physio_acq_time, skip_eye_events):
+    """Loads the acquisition time, physio data and event data for a single
+    EDF file. Module-level so it can run in a worker process when a session
+    is converted in parallel."""
+    return (get_physio_acq_time(physio_file),
+            get_physio_data(physio_file, skip_eye_events),
+            get_event_data(physio_file))
+
+
 def convert_edf_session(physio_files, bids_dir, sub, ses=None,
                         get_physio_data=None,
                         get_event_data=None,
                         get_physio_acq_time=None,
-                        outdir=None, skip_eye_events=False):
+                        outdir=None, skip_eye_events=False,
+                        layout=None):
     """Function to save the EDF data in a given folder as BIDS physiology and events files, matching the filenames from the study imaging files
         
     Parameters
@@ -479,18 +588,36 @@ def convert_edf_session(physio_files, bids_dir, sub, ses=None,
         Default: bids_dir
     skip_eye_events : bool
         Skip saving eye motion events (fixations, saccades and blinks) as estimated by Eyelink algorithms
+    layout : bids.layout.BIDSLayout or None, optional
+        Pre-built layout of the BIDS dataset. If None, it is built (and
+        cached) from bids_dir.
     """
     
     # Default out_dir is bids_dir:
     outdir = outdir or bids_dir
-    
-    file_times = [get_physio_acq_time(f) for f in physio_files]
+
+    # Reading each EDF file is independent of the rest, so for a session
+    # with several files we parse them in parallel, one worker per file:
+    loader = partial(_load_edf_file,
+                     get_physio_data=get_physio_data,
+                     get_event_data=get_event_data,
+                     get_physio_acq_time=get_physio_acq_time,
+                     skip_eye_events=skip_eye_events)
+    if len(physio_files) > 1:
+        with ProcessPoolExecutor(
+                max_workers=min(len(physio_files), os.cpu_count())
+        ) as executor:
+            loaded = list(executor.map(loader, physio_files))
+    else:
+        loaded = [loader(f) for f in physio_files]
+
+    file_times = [l[0] for l in loaded]
     # relative to the first one:
     rel_file_times = [(f - min(file_times)).total_seconds() for f in file_times]
-    
-    physio_data = [get_physio_data(f, skip_eye_events) for f in physio_files]
-    event_data = [get_event_data(f) for f in physio_files]
-    
+
+    physio_data = [l[1] for l in loaded]
+    event_data = [l[2] for l in loaded]
+
     onsets_in_sec = [
                      p.get_scanner_onset() + rt for p, rt in zip(physio_data, rel_file_times)
     ]
@@ -505,22 +632,20 @@ def convert_edf_session(physio_files, bids_dir, sub, ses=None,
     )
                      
     # Now, for the scanner timing:
-    layout = BIDSLayout(bids_dir)
+    layout = layout or _get_layout(bids_dir)
     df = load_scan_data(layout, sub=sub, ses=ses)
                      
     out_df = synchronize_onsets(physio_df, df)
                      
     sourcedir = op.join(outdir, 'sourcedata')
-    if not op.isdir(sourcedir):
-        os.makedirs(sourcedir)
+    os.makedirs(sourcedir, exist_ok=True)
     sub_ses_dir = op.join('sub-' + sub, ('ses-' + str(ses)) if ses else '')
 
     for (phys_file, phys_data, ev_data, scan_file) in zip(out_df['filename'], out_df['data'], out_df['event_data'], out_df['scan_fname']):
         if scan_file:
             prefix = op.join(sub_ses_dir, scan_file.split('.nii')[0])
             outdir_ = op.join(outdir, op.dirname(prefix))
-            if not op.isdir(outdir_):
-                os.makedirs(outdir_)
+            os.makedirs(outdir_, exist_ok=True)
             phys_data.save_to_bids_with_trigger(op.join(outdir, prefix))
             if ev_data:
                 if not os.path.exists(op.join(outdir, prefix) + '_events.tsv'):
@@ -68,11 +68,21 @@ def mock_layout_get(*args, **kwargs):
     return [MockBidsFile(path='scan_{}'.format(i)) for i in range(N_RUNS + 1)]
 
 
+class MockNiftiImage(object):
+    """ Class that mocks a nibabel image, so we can mock the header
+    without the need to include an image file in the tests.
+    """
+    class header(object):
+        @staticmethod
+        def get_data_shape():
+            return [1, 1, 1, N_VOLS]
+
+
 def mock_nibabel_load(*args, **kwargs):
-    """ Mock the method nibabel.load so that it returns a np.array
-    of shape [1, 1, 1, N_VOLS]:
+    """ Mock the method nibabel.load so that it returns an image whose
+    header reports a shape of [1, 1, 1, N_VOLS]:
     """
-    return np.array([0]*N_VOLS).reshape([1, 1, 1, N_VOLS])
+    return MockNiftiImage()
 
 
 class MockPhysioData(object):